@@ -0,0 +1,55 @@
+import os
+import pickle
+import sqlite3
+import threading
+from datetime import datetime
+
+DEFAULT_CACHE_FILE = 'data/analysis_cache.sqlite'
+
+
+class AnalysisCache:
+    """
+    Article analysis results (parsed document and statistics) stored in SQLite, keyed by (content_hash, key).
+    content_hash is the hash of the article markdown and key identifies the analyzer (version and tagger),
+    so a changed article or analyzer is analyzed again. Results are pickled, the cache is local and never shared.
+    """
+
+    def __init__(self, key: str, file_name: str = DEFAULT_CACHE_FILE):
+        self.key = key
+        self.file_name = file_name
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(file_name, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS results (
+                                   content_hash TEXT NOT NULL,
+                                   analyzer_key TEXT NOT NULL,
+                                   result BLOB NOT NULL,
+                                   created_at TEXT NOT NULL,
+                                   PRIMARY KEY (content_hash, analyzer_key))""")
+        self.connection.commit()
+
+    def get_many(self, content_hashes: list) -> dict:
+        """
+        Returns {content_hash: result} of the cached content hashes
+        """
+        results = {}
+        content_hashes = list(set(content_hashes))
+        # Stay below the sqlite limit of query parameters
+        for i in range(0, len(content_hashes), 500):
+            chunk = content_hashes[i:i + 500]
+            rows = self.connection.execute(f"SELECT content_hash, result FROM results WHERE analyzer_key = ? AND content_hash IN ({','.join('?' * len(chunk))})",
+                                           (self.key, *chunk))
+            results.update({content_hash: pickle.loads(result) for content_hash, result in rows})
+        return results
+
+    def put_many(self, results: dict):
+        created_at = datetime.now().isoformat()
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                        [(content_hash, self.key, pickle.dumps(result), created_at) for content_hash, result in results.items()])
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
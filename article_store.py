@@ -0,0 +1,245 @@
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+from datetime import datetime, date, time
+
+DEFAULT_STORE_PATH = 'data/store'
+
+# Version of the store format, saved in every manifest
+STORE_VERSION = 1
+
+# Article timestamps as returned by get_data.get_timestamp()
+TIMESTAMP_FIELDS = ["created_at", "published_at", "modified_at"]
+
+LEGACY_PICKLE_RE = re.compile(r'(?P<username>.+)_(?P<articles_limit>\d+)\.pickle')
+
+
+def atomic_write(data: bytes, file_name: str):
+    """
+    Write data to a temporary file and move it in place, so a crash never leaves a partial file
+    """
+    directory = os.path.dirname(file_name) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, file_name)
+    except BaseException:
+        os.remove(temp_name)
+        raise
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf8')).hexdigest()
+
+
+def encode_timestamp(timestamp: dict) -> dict:
+    return {"date": timestamp["date"].isoformat() if timestamp.get("date") else None,
+            "time": timestamp["time"].isoformat() if timestamp.get("time") else None,
+            "time_period": list(timestamp["time_period"]) if timestamp.get("time_period") else None}
+
+
+def decode_timestamp(timestamp: dict) -> dict:
+    return {"date": date.fromisoformat(timestamp["date"]) if timestamp["date"] else None,
+            "time": time.fromisoformat(timestamp["time"]) if timestamp["time"] else None,
+            "time_period": tuple(timestamp["time_period"]) if timestamp["time_period"] else None}
+
+
+class ProfileStore:
+    """
+    Versioned on-disk cache of a profile, one directory per user (<path>/<username>/):
+    - manifest.json : store version, user id and info, article ids (newest first)
+    - articles.jsonl : article metadata table (with the markdown_hash of the article), one row per article
+      (append only, the last row of an article wins)
+    - links.jsonl : links table, one [article_id, [[text, href], ...]] row per article (append only, the last row of an article wins)
+    - markdown/<article_id>.md.gz : compressed article markdown, loaded only when an article is (re)analyzed
+    Tables are appended one line per write, so an interrupted write can only lose its own (ignored) partial line, and the
+    manifest and markdown files are written atomically (see atomic_write()). An article is stored once its articles.jsonl
+    row is written, after its markdown and links, so every saved article is a checkpoint of a download.
+    """
+
+    def __init__(self, username: str, path: str = DEFAULT_STORE_PATH):
+        self.username = username
+        self.directory = os.path.join(path, username)
+        self.rows = None
+        self.links = None
+        self.lock = threading.Lock()
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def markdown_file(self, article_id: str) -> str:
+        return self.file(os.path.join('markdown', f'{article_id}.md.gz'))
+
+    def load_manifest(self) -> dict:
+        """
+        Returns {"version", "user": {"id", "info"}, "article_ids": [...], "articles_limit", "fetched_at"} or None.
+        article_ids are the user's first <articles_limit> articles (all articles if 0).
+        """
+        if not os.path.exists(self.file('manifest.json')):
+            return None
+        with open(self.file('manifest.json'), encoding='utf8') as f:
+            manifest = json.load(f)
+        if manifest["version"] != STORE_VERSION:
+            raise ValueError(f"{self.directory} has store version {manifest['version']}, expected {STORE_VERSION}")
+        return manifest
+
+    def save_manifest(self, user: dict, article_ids: list, articles_limit: int = 0):
+        manifest = {"version": STORE_VERSION, "user": user, "article_ids": article_ids, "articles_limit": articles_limit,
+                    "fetched_at": datetime.now().isoformat()}
+        atomic_write(json.dumps(manifest).encode('utf8'), self.file('manifest.json'))
+
+    @staticmethod
+    def read_table(file_name: str) -> list:
+        if not os.path.exists(file_name):
+            return []
+        table = []
+        with open(file_name, encoding='utf8') as f:
+            for line in f:
+                try:
+                    table.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Partial line of an interrupted write
+                    continue
+        return table
+
+    def append_table(self, name: str, rows: list):
+        data = "".join(json.dumps(row) + "\n" for row in rows).encode('utf8')
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.file(name), 'a+b') as f:
+            # End the partial line of an interrupted write, else the first appended row would be part of it
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    data = b"\n" + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load_tables(self):
+        """
+        Load article metadata and links tables once
+        """
+        if self.rows is not None:
+            return
+        self.rows = {row["id"]: row for row in self.read_table(self.file('articles.jsonl'))}
+        self.links = {article_id: links for article_id, links in self.read_table(self.file('links.jsonl'))}
+
+    def has_article(self, article_id: str) -> bool:
+        self.load_tables()
+        return article_id in self.rows
+
+    def load_article_record(self, article_id: str) -> dict:
+        """
+        Returns {"article": <article without markdown>, "fetched_at": <datetime>, "stats_fetched_at": <datetime>}
+        """
+        self.load_tables()
+        row = dict(self.rows[article_id])
+        fetched_at = datetime.fromisoformat(row.pop("fetched_at"))
+        stats_fetched_at = datetime.fromisoformat(row.pop("stats_fetched_at"))
+        for field in TIMESTAMP_FIELDS:
+            row[field] = decode_timestamp(row[field])
+        row["links"] = [tuple(link) for link in self.links.get(article_id, [])]
+        return {"article": row, "fetched_at": fetched_at, "stats_fetched_at": stats_fetched_at}
+
+    def load_article(self, article_id: str) -> dict:
+        """
+        Article metadata and links, use load_markdown() to get its markdown
+        """
+        return self.load_article_record(article_id)["article"]
+
+    def load_markdown(self, article_id: str) -> str:
+        with gzip.open(self.markdown_file(article_id), 'rt', encoding='utf8') as f:
+            return f.read()
+
+    def markdown_hash(self, article_id: str) -> str:
+        """
+        Hash of the article markdown, computed on save (or on first use for articles stored without it)
+        """
+        self.load_tables()
+        row = self.rows[article_id]
+        if "markdown_hash" not in row:
+            row["markdown_hash"] = content_hash(self.load_markdown(article_id))
+        return row["markdown_hash"]
+
+    def save_article(self, article: dict, fetched_at: datetime = None, stats_fetched_at: datetime = None):
+        """
+        Save an article. Markdown and links are saved the first time an article is saved (or when markdown is given).
+        """
+        fetched_at = fetched_at or datetime.now()
+        row = {key: value for key, value in article.items() if key not in ["markdown", "links"]}
+        for field in TIMESTAMP_FIELDS:
+            row[field] = encode_timestamp(article[field])
+        row["fetched_at"] = fetched_at.isoformat()
+        row["stats_fetched_at"] = (stats_fetched_at or fetched_at).isoformat()
+
+        with self.lock:
+            self.load_tables()
+            if "markdown" in article:
+                row["markdown_hash"] = content_hash(article["markdown"])
+                atomic_write(gzip.compress(article["markdown"].encode('utf8')), self.markdown_file(article["id"]))
+            elif "markdown_hash" in self.rows.get(article["id"], {}):
+                row["markdown_hash"] = self.rows[article["id"]]["markdown_hash"]
+            if "markdown" in article or article["id"] not in self.rows:
+                links = [list(link) for link in article.get("links", [])]
+                self.append_table('links.jsonl', [[article["id"], links]])
+                self.links[article["id"]] = links
+            self.append_table('articles.jsonl', [row])
+            self.rows[article["id"]] = row
+
+    def import_articles(self, articles: list, fetched_at: datetime = None) -> int:
+        """
+        Import articles (with markdown) that are not already stored
+        """
+        imported = 0
+        for article in articles:
+            if not self.has_article(article["id"]):
+                self.save_article(article, fetched_at=fetched_at)
+                imported += 1
+        return imported
+
+    def compact(self):
+        """
+        Rewrite the articles and links tables keeping only the last row of each article
+        """
+        self.load_tables()
+        with self.lock:
+            atomic_write("".join(json.dumps(row) + "\n" for row in self.rows.values()).encode('utf8'), self.file('articles.jsonl'))
+            atomic_write("".join(json.dumps([article_id, links]) + "\n" for article_id, links in self.links.items()).encode('utf8'),
+                         self.file('links.jsonl'))
+
+
+def migrate_pickle(file_name: str, path: str = DEFAULT_STORE_PATH) -> int:
+    """
+    Import a <username>_<articles_limit>.pickle file to the store of <username>, returns the number of imported articles
+    """
+    match = LEGACY_PICKLE_RE.fullmatch(os.path.basename(file_name))
+    username, articles_limit = match.group("username"), int(match.group("articles_limit"))
+    with open(file_name, 'rb') as f:
+        data = pickle.load(f)
+
+    store = ProfileStore(username, path=path)
+    imported = store.import_articles(data["articles"], fetched_at=datetime.fromtimestamp(os.path.getmtime(file_name)))
+
+    # Keep the article ids of the pickle with the most articles
+    manifest = store.load_manifest()
+    if manifest is None or (manifest["articles_limit"] and (not articles_limit or articles_limit > manifest["articles_limit"])):
+        store.save_manifest(data["user"], [article["id"] for article in data["articles"]], articles_limit=articles_limit)
+    store.compact()
+    return imported
+
+
+if __name__ == "__main__":
+    # Migrate pickle files, e.g. python article_store.py data/*.pickle
+    for pickle_file_name in sys.argv[1:]:
+        print(f"imported {migrate_pickle(pickle_file_name)} articles from {pickle_file_name}...")
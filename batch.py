@@ -0,0 +1,146 @@
+import argparse
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from kgraph import render_html, load_template, get_profile, build_merged_graph, write_html, DEFAULT_ARTICLES_LIMIT, DEFAULT_ISOLATE_ARTICLES, \
+    FIXED_LAST_DATE, USE_GPT, DEFAULT_SPLIT_OUTPUT, DEFAULT_STREAM, DEFAULT_RESUME, \
+    DEFAULT_BOUNDED_MEMORY
+from text_analyzer import load_resources, DEFAULT_TAGGER, TAGGERS
+from disk_counter import close_articles
+import instrumentation
+
+DEFAULT_PROCESSES = 4
+
+
+def load_usernames(file_name: str) -> list:
+    """
+    One username per line, empty lines and lines starting with # are ignored
+    """
+    with open(file_name, encoding='utf8') as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def init_worker():
+    """
+    Load shared resources (template, stopwords, stemmer, tagger) once per worker process
+    """
+    load_template()
+    load_resources()
+
+
+def render_profile(username: str, **kwargs) -> dict:
+    """
+    Render a profile, failures are returned instead of raised so that they do not stop the batch
+    """
+    start = time.perf_counter()
+    # Worker processes render many profiles, keep the stage timings and counters of each profile apart
+    instrumentation.reset()
+    try:
+        output_file_name = render_html(username=username, **kwargs)
+        return {"username": username, "status": "ok", "seconds": time.perf_counter() - start, "output": output_file_name,
+                "report": instrumentation.report()}
+    except Exception as exc:
+        traceback.print_exc()
+        return {"username": username, "status": "failed", "seconds": time.perf_counter() - start, "output": f"{type(exc).__name__}: {exc}",
+                "report": instrumentation.report()}
+
+
+def run_batch(usernames: list, processes: int = DEFAULT_PROCESSES, **kwargs) -> list:
+    """
+    Render many profiles in a pool of <processes> processes, kwargs are passed to kgraph.render_html()
+    """
+    if processes <= 1:
+        init_worker()
+        return [render_profile(username, **kwargs) for username in usernames]
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker) as executor:
+        futures = [executor.submit(render_profile, username, **kwargs) for username in usernames]
+        return [future.result() for future in futures]
+
+
+def load_profile(username: str, **kwargs) -> tuple:
+    """
+    Analyzed articles of a user and its result, failures are returned instead of raised so that they do not stop the batch
+    """
+    start = time.perf_counter()
+    try:
+        profile = get_profile(username, **kwargs)
+        return profile, {"username": username, "status": "ok", "seconds": time.perf_counter() - start, "output": f"{len(profile['articles'])} articles"}
+    except Exception as exc:
+        traceback.print_exc()
+        return None, {"username": username, "status": "failed", "seconds": time.perf_counter() - start, "output": f"{type(exc).__name__}: {exc}"}
+
+
+def run_merged(usernames: list, name: str, processes: int = DEFAULT_PROCESSES, split_output: bool = DEFAULT_SPLIT_OUTPUT, **kwargs) -> list:
+    """
+    Load many profiles in a pool of <processes> processes and render them as one merged graph to output/<name>.html
+    (see kgraph.build_merged_graph()), kwargs are passed to kgraph.get_profile()
+    """
+    if processes <= 1:
+        init_worker()
+        loaded = [load_profile(username, **kwargs) for username in usernames]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=init_worker) as executor:
+            futures = [executor.submit(load_profile, username, **kwargs) for username in usernames]
+            loaded = []
+            for username, future in zip(usernames, futures):
+                # A profile that cannot be returned from its process (e.g. not picklable) fails alone, as in load_profile()
+                try:
+                    loaded.append(future.result())
+                except Exception as exc:
+                    loaded.append((None, {"username": username, "status": "failed", "seconds": 0.0, "output": f"{type(exc).__name__}: {exc}"}))
+
+    profiles = {result["username"]: profile for profile, result in loaded if profile}
+    try:
+        if profiles:
+            start = time.perf_counter()
+            dataset = build_merged_graph(profiles)
+            output_file_name = write_html(dataset, f'output/{name}', user=name, split_output=split_output)
+            print(f"{len(dataset['nodes'])} nodes, {len(dataset['edges'])} edges of {len(profiles)} profiles in {time.perf_counter() - start:.1f} seconds: {output_file_name}")
+    finally:
+        for profile in profiles.values():
+            close_articles(profile)
+    return [result for profile, result in loaded]
+
+
+def print_summary(results: list):
+    print(f"\n{'username':<30}{'status':<10}{'seconds':>10}  output")
+    for rs in results:
+        print(f"{rs['username']:<30}{rs['status']:<10}{rs['seconds']:>10.1f}  {rs['output']}")
+    failed = len([rs for rs in results if rs["status"] != "ok"])
+    print(f"\n{len(results) - failed} ok, {failed} failed, {sum(rs['seconds'] for rs in results):.1f} seconds of work")
+
+
+if __name__ == "__main__":
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", help="file with one username per line")
+    parser.add_argument("-p", "--processes", type=int, default=DEFAULT_PROCESSES, help="number of profiles rendered in parallel")
+    parser.add_argument("-l", "--limit", type=int, default=DEFAULT_ARTICLES_LIMIT, help="maximum number of articles to retrieve")
+    parser.add_argument("-i", "--isolate", action="store_true", default=DEFAULT_ISOLATE_ARTICLES, help="whether to isolate articles")
+    parser.add_argument("-fd", "--fdate", type=str, default=FIXED_LAST_DATE, help="fixed last date to calculate last seen")
+    parser.add_argument("-ai", "--ai", action="store_true", default=USE_GPT, help="use chatgpt to extract keywords and summary")
+    parser.add_argument("-t", "--tagger", choices=TAGGERS.keys(), default=DEFAULT_TAGGER, help="part-of-speech tagger (lexicon is faster, less accurate)")
+    parser.add_argument("-so", "--split-output", action="store_true", default=DEFAULT_SPLIT_OUTPUT, help="write graphs to separate ndjson files")
+    parser.add_argument("-st", "--stream", action="store_true", default=DEFAULT_STREAM, help="download, analyze and enrich articles as overlapping stages")
+    parser.add_argument("-rs", "--resume", action="store_true", default=DEFAULT_RESUME, help="resume interrupted downloads with the stored article lists")
+    parser.add_argument("-bm", "--bounded-memory", action="store_true", default=DEFAULT_BOUNDED_MEMORY, help="stream articles and keep profile word counts on disk")
+    parser.add_argument("-sd", "--since", type=str, default=None, help="only analyze articles published on or after this date (YYYY-MM-DD)")
+    parser.add_argument("-ud", "--until", type=str, default=None, help="only analyze articles published on or before this date (YYYY-MM-DD)")
+    parser.add_argument("-rp", "--report", type=str, default=None, help="write the results with stage timings and counters per user to this json file")
+    parser.add_argument("-m", "--merge", type=str, default=None, help="render one merged graph of all users to output/<merge>.html (mixed version)")
+    args = parser.parse_args()
+
+    if args.merge:
+        results = run_merged(load_usernames(args.file), args.merge, processes=args.processes, split_output=args.split_output, articles_limit=args.limit,
+                             fixed_last_date=args.fdate, use_gpt=args.ai, tagger=args.tagger, stream=args.stream, resume=args.resume,
+                             bounded_memory=args.bounded_memory, since=args.since, until=args.until)
+    else:
+        results = run_batch(load_usernames(args.file), processes=args.processes, isolate_articles=args.isolate, articles_limit=args.limit,
+                            fixed_last_date=args.fdate, use_gpt=args.ai, tagger=args.tagger, split_output=args.split_output, stream=args.stream, resume=args.resume,
+                            bounded_memory=args.bounded_memory, since=args.since, until=args.until)
+    print_summary(results)
+    if args.report:
+        instrumentation.write_report(args.report, args=vars(args), results=results)
@@ -0,0 +1,267 @@
+import argparse
+import contextlib
+import io
+import os
+import pickle
+import random
+import tempfile
+import time
+from glob import glob
+
+import bs4
+import markdown
+
+import get_data
+from get_data import load_js_state, load_js_state_node, get_articles
+from http_client import HttpClient
+from fake_server import article_html, FakeMedium, FaultInjector, start_server, server_urls
+from nltk import PorterStemmer
+from nltk.corpus import stopwords
+
+from text_analyzer import parse_markdown, html_to_words, text_stemmer, stem, perceptron_tags, lexicon_tags, pos_tagger, load_resources, LEXICON
+from kgraph import build_graph, build_merged_graph
+from links import normalize_links
+from article_store import ProfileStore, migrate_pickle
+
+DEFAULT_REPEAT = 20
+
+
+def timeit(func, repeat: int = DEFAULT_REPEAT) -> float:
+    """
+    Return the best time (in ms) of <repeat> calls of func
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def load_profiles(pattern: str = 'data/*.pickle') -> dict:
+    profiles = {}
+    for file_name in sorted(glob(pattern)):
+        with open(file_name, 'rb') as f:
+            profiles[file_name] = pickle.load(f)
+    return profiles
+
+
+def bench_js_state(repeat: int):
+    """
+    Compare the in-process JS state extractor with the node subprocess
+    """
+    print(f"{'profile':<45}{'python (ms)':>12}{'node (ms)':>12}{'speedup':>10}")
+    for file_name, profile in load_profiles().items():
+        soup = bs4.BeautifulSoup(article_html(profile["articles"][0]), features="lxml")
+        assert load_js_state(soup, state='window.__APOLLO_STATE__') == load_js_state_node(soup, state='window.__APOLLO_STATE__')
+
+        python_ms = timeit(lambda: load_js_state(soup, state='window.__APOLLO_STATE__'), repeat)
+        node_ms = timeit(lambda: load_js_state_node(soup, state='window.__APOLLO_STATE__'), repeat)
+        print(f"{file_name:<45}{python_ms:>12.2f}{node_ms:>12.2f}{node_ms / python_ms:>9.0f}x")
+
+
+def parse_markdown_per_stage(markdown_text: str):
+    """
+    Previous behaviour, every stage (ChatGPT, NLP analysis) converted and parsed the markdown on its own
+    """
+    for _ in range(2):
+        soup = bs4.BeautifulSoup(markdown.markdown(markdown_text), features="lxml")
+        soup.find('h1')
+        soup.find(['h2', 'h3', 'h4'])
+        html_to_words(soup)
+
+
+def bench_parse(repeat: int):
+    """
+    Compare parsing each article once (parse_markdown) with parsing it once per stage
+    """
+    print(f"{'profile':<45}{'per stage (ms)':>16}{'once (ms)':>12}{'speedup':>10}")
+    for file_name, profile in load_profiles().items():
+        markdowns = [article["markdown"] for article in profile["articles"]]
+        per_stage_ms = timeit(lambda: [parse_markdown_per_stage(x) for x in markdowns], repeat)
+        once_ms = timeit(lambda: [parse_markdown(x) for x in markdowns], repeat)
+        print(f"{file_name:<45}{per_stage_ms:>16.1f}{once_ms:>12.1f}{per_stage_ms / once_ms:>9.1f}x")
+
+
+def bench_fetch(repeat: int):
+    """
+    Download time of a profile from a local fake server (see fake_server.py) with 50ms latency, by number of workers,
+    without and with injected failures (5% 500 and 5% 429 responses, retried)
+    """
+    medium = FakeMedium()
+    user_id = medium.user_ids["umairh"]
+    article_ids = medium.user_articles[user_id]
+
+    print(f"{'faults':<10}{'workers':>8}{'time (ms)':>12}{'articles/s':>12}{'attempts':>10}{'errors':>8}")
+    for faults_name, error_rate, throttle_rate in [("none", 0, 0), ("5%+5%", 0.05, 0.05)]:
+        server = start_server(medium, FaultInjector(latency=0.05, error_rate=error_rate, throttle_rate=throttle_rate, retry_after=0, seed=0))
+        urls = server_urls(server)
+        get_data.API_URL, get_data.ARTICLE_URL = urls["MEDIUM_API_URL"], urls["MEDIUM_ARTICLE_URL"]
+        try:
+            for workers in [1, 4, 8, 16]:
+                client = HttpClient(pool_size=workers * 2, backoff=0.05, max_tries=5)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    fetch_ms = timeit(lambda: get_articles(user_id, article_ids, workers=workers, client=client), repeat)
+                attempts = sum(stats["attempts"] for stats in client.stats.values())
+                errors = sum(stats["errors"] for stats in client.stats.values())
+                print(f"{faults_name:<10}{workers:>8}{fetch_ms:>12.0f}{len(article_ids) / fetch_ms * 1000:>12.1f}{attempts:>10}{errors:>8}")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def synthetic_graph_input(articles_num: int, links_per_article: int, domains_num: int = 500, seed: int = 0, username: str = "user") -> dict:
+    """
+    Build an analyzed profile (as returned by MediumArticles.get_all_articles) with random links
+    """
+    rnd = random.Random(seed)
+    articles = []
+    for i in range(articles_num):
+        links = []
+        for j in range(links_per_article):
+            if rnd.random() < 0.1:
+                href = f"https://medium.com/@{username}/article-{rnd.randrange(articles_num)}"
+            else:
+                href = f"https://www.domain{rnd.randrange(domains_num)}.com/page-{rnd.randrange(1000)}"
+            links.append((f"link {j}", href))
+        articles.append({"id": f"{username}-{i}", "url": f"https://medium.com/@{username}/article-{i}", "voter_count": rnd.randrange(1000), "links": links, "normalized_links": normalize_links(links),
+                         "stats": "", "stats_dict": {"h1": f"Article {i}", "h2": ""}})
+    return {"articles": articles, "user": {"profile": "", "info": {"image_url": ""}}}
+
+
+def bench_graph(repeat: int):
+    """
+    Graph building time should grow linearly with the number of links
+    """
+    print(f"{'articles':>10}{'links':>10}{'edges':>10}{'time (ms)':>12}{'us/link':>10}")
+    for articles_num in [100, 200, 400, 800, 1600]:
+        links_per_article = 20
+        graph_input = synthetic_graph_input(articles_num, links_per_article)
+        graph = build_graph(graph_input, isolate_articles=False)
+        graph_ms = timeit(lambda: build_graph(graph_input, isolate_articles=False), repeat)
+        links_num = articles_num * links_per_article
+        print(f"{articles_num:>10}{links_num:>10}{len(graph['edges']):>10}{graph_ms:>12.1f}{graph_ms * 1000 / links_num:>10.1f}")
+
+
+def bench_merged(repeat: int):
+    """
+    Merged graph building time should grow linearly with the number of authors
+    """
+    print(f"{'authors':>10}{'links':>10}{'nodes':>10}{'edges':>10}{'time (ms)':>12}{'us/link':>10}")
+    for authors_num in [10, 50, 100, 200, 400]:
+        articles_num, links_per_article = 50, 20
+        profiles = {f"user{i}": synthetic_graph_input(articles_num, links_per_article, domains_num=5000, seed=i, username=f"user{i}")
+                    for i in range(authors_num)}
+        graph = build_merged_graph(profiles)
+        graph_ms = timeit(lambda: build_merged_graph(profiles), repeat)
+        links_num = authors_num * articles_num * links_per_article
+        print(f"{authors_num:>10}{links_num:>10}{len(graph['nodes']):>10}{len(graph['edges']):>10}{graph_ms:>12.1f}{graph_ms * 1000 / links_num:>10.1f}")
+
+
+def text_stemmer_per_call(words: list) -> list:
+    """
+    Previous behaviour, a new stemmer and stopwords list on every call and every word stemmed twice
+    """
+    stemmer = PorterStemmer()
+    stop_words = set(stopwords.words('english'))
+    stemmed_normal_index = {stemmer.stem(word): word for word in words if word not in stop_words}
+    return [stemmed_normal_index[stemmer.stem(word)] for word in words if word not in stop_words and len(word) > 2]
+
+
+def bench_stem(repeat: int):
+    """
+    Compare memoized stemming (text_stemmer) with stemming on every call, for all articles of each profile
+    """
+    print(f"{'profile':<45}{'per call (ms)':>15}{'memoized (ms)':>15}{'speedup':>10}")
+    for file_name, profile in load_profiles().items():
+        articles_words = [parse_markdown(article["markdown"])["words"] for article in profile["articles"]]
+        assert [text_stemmer(words) for words in articles_words] == [text_stemmer_per_call(words) for words in articles_words]
+
+        per_call_ms = timeit(lambda: [text_stemmer_per_call(words) for words in articles_words], repeat)
+        # The memo is shared between profiles, clear it to measure a cold profile
+        cold_ms = timeit(lambda: (stem.cache_clear(), [text_stemmer(words) for words in articles_words]), 1)
+        memoized_ms = timeit(lambda: [text_stemmer(words) for words in articles_words], repeat)
+        print(f"{file_name:<45}{per_call_ms:>15.1f}{memoized_ms:>15.1f}{per_call_ms / memoized_ms:>9.1f}x (cold {cold_ms:.1f} ms)")
+
+
+def bench_tagger(repeat: int):
+    """
+    Speed and accuracy of the lexicon tagger, compared with the perceptron tagger (used as reference)
+    """
+    load_resources()
+    print(f"{'profile':<45}{'perceptron (ms)':>17}{'lexicon (ms)':>14}{'cold (ms)':>11}{'tag acc':>9}{'adj/noun/verb diff':>22}")
+    for file_name, profile in load_profiles().items():
+        articles_words = [parse_markdown(article["markdown"])["words"] for article in profile["articles"]]
+
+        perceptron_ms = timeit(lambda: [perceptron_tags(words) for words in articles_words], repeat)
+        # The lexicon memo is shared between profiles, clear it to measure a cold profile
+        cold_ms = timeit(lambda: (LEXICON.clear(), [lexicon_tags(words) for words in articles_words]), 1)
+        lexicon_ms = timeit(lambda: [lexicon_tags(words) for words in articles_words], repeat)
+
+        tags_num, tags_same = 0, 0
+        pos_diff = {"adj": 0, "noun": 0, "verb": 0}
+        for words in articles_words:
+            tags_num += len(words)
+            tags_same += sum(x == y for x, y in zip(perceptron_tags(words), lexicon_tags(words)))
+            perceptron_pos, lexicon_pos = pos_tagger(words, tagger="perceptron"), pos_tagger(words, tagger="lexicon")
+            for pos in pos_diff:
+                pos_diff[pos] += lexicon_pos[pos] - perceptron_pos[pos]
+
+        diff = "/".join(f"{pos_diff[pos]:+d}" for pos in ["adj", "noun", "verb"])
+        print(f"{file_name:<45}{perceptron_ms:>17.1f}{lexicon_ms:>14.1f}{cold_ms:>11.1f}{tags_same / tags_num:>9.1%}{diff:>22}")
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def load_store(store_path: str, username: str, with_markdown: bool) -> list:
+    store = ProfileStore(username, path=store_path)
+    articles = [store.load_article(article_id) for article_id in store.load_manifest()["article_ids"]]
+    if with_markdown:
+        for article in articles:
+            article["markdown"] = store.load_markdown(article["id"])
+    return articles
+
+
+def bench_store(repeat: int):
+    """
+    Compare loading a profile pickle with loading the profile store, with and without markdown
+    """
+    print(f"{'profile':<45}{'pickle (ms)':>13}{'store (ms)':>12}{'+markdown (ms)':>16}{'pickle (KB)':>13}{'store (KB)':>12}")
+    with tempfile.TemporaryDirectory() as store_path:
+        for file_name in sorted(glob('data/*.pickle')):
+            migrate_pickle(file_name, path=store_path)
+            store = ProfileStore(os.path.basename(file_name).rsplit('_', 1)[0], path=store_path)
+
+            def load_pickle():
+                with open(file_name, 'rb') as f:
+                    return pickle.load(f)
+
+            pickle_ms = timeit(load_pickle, repeat)
+            store_ms = timeit(lambda: load_store(store_path, store.username, with_markdown=False), repeat)
+            markdown_ms = timeit(lambda: load_store(store_path, store.username, with_markdown=True), repeat)
+            print(f"{file_name:<45}{pickle_ms:>13.1f}{store_ms:>12.1f}{markdown_ms:>16.1f}"
+                  f"{os.path.getsize(file_name) / 1024:>13.0f}{directory_size(store.directory) / 1024:>12.0f}")
+
+
+BENCHMARKS = {
+    "js_state": bench_js_state,
+    "fetch": bench_fetch,
+    "parse": bench_parse,
+    "graph": bench_graph,
+    "merged": bench_merged,
+    "stem": bench_stem,
+    "tagger": bench_tagger,
+    "store": bench_store,
+}
+
+if __name__ == "__main__":
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", choices=BENCHMARKS.keys(), help="benchmark to run")
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT, help="number of repetitions (best time is reported)")
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark](repeat=args.repeat)
@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from glob import glob
+from operator import itemgetter
+
+from article_store import ProfileStore, migrate_pickle
+from get_data import MediumArticles, get_timestamp
+from kgraph import build_graph, write_html
+from text_analyzer import parse_markdown, page_analyzer, counts, pos_tagger, load_resources, DEFAULT_TAGGER, TAGGERS
+
+DEFAULT_RESULTS_FILE = 'benchmarks/results.jsonl'
+DEFAULT_SIZES = "100,1000,10000"
+DEFAULT_FIXED_LAST_DATE = '2023-04-05'
+# Share of synthetic links that point to another article of the same profile
+SYNTHETIC_INTERNAL_LINKS = 0.1
+
+
+def load_pickle(file_name: str) -> dict:
+    with open(file_name, 'rb') as f:
+        return pickle.load(f)
+
+
+def synthetic_profile(articles_num: int, source_articles: list, seed: int = 0, username: str = None) -> dict:
+    """
+    Build a profile of <articles_num> articles by sampling real articles (markdown, links and stats) of the bundled profiles.
+    Every article gets a new id, url and publish date, a unique first line (so that it is analyzed and not deduplicated by the
+    analysis cache) and SYNTHETIC_INTERNAL_LINKS of its links point to other articles of the profile.
+    """
+    rnd = random.Random(seed)
+    username = username or f"synthetic-{articles_num}"
+    article_ids = [f"{seed:04x}{i:08x}" for i in range(articles_num)]
+    urls = [f"https://medium.com/@{username}/article-{article_id}" for article_id in article_ids]
+    last_date = datetime(2023, 4, 1)
+
+    articles = []
+    for i, article_id in enumerate(article_ids):
+        source = rnd.choice(source_articles)
+        links = [(text, rnd.choice(urls) if rnd.random() < SYNTHETIC_INTERNAL_LINKS else href) for text, href in source["links"]]
+        published_at = get_timestamp((last_date - timedelta(days=i * 3, minutes=rnd.randrange(24 * 60))).strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
+        articles.append({**source, "id": article_id, "identifier": article_id, "url": urls[i], "links": links,
+                         "markdown": f"Synthetic article {article_id}\n\n{source['markdown']}",
+                         "created_at": published_at, "published_at": published_at, "modified_at": published_at})
+
+    user_info = {"id": username, "username": username, "fullname": username, "bio": "synthetic profile", "followers_count": 1000,
+                 "following_count": 100, "image_url": "", "top_writer_in": [], "medium_member_at": "2020-01-01 00:00:00"}
+    return {"user": {"id": username, "info": user_info}, "articles": articles}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func, memory: bool = True) -> tuple:
+    """
+    Run func quietly (without its print output), returns (result, seconds, peak traced memory in MB or None)
+    """
+    if memory:
+        tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            seconds = time.perf_counter() - start
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20 if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return result, seconds, peak_mb
+
+
+def run_profile(username: str, store_path: str, output_path: str, memory: bool, tagger: str, analysis_workers: int) -> list:
+    """
+    Benchmark the stages of a profile stored in <store_path>, returns [(stage, seconds, peak_mb)]
+    """
+    store = ProfileStore(username, path=store_path)
+    manifest = store.load_manifest()
+    analysis_cache_file = os.path.join(store_path, 'analysis_cache.sqlite')
+
+    def get_all_articles():
+        return MediumArticles(username, articles_limit=manifest["articles_limit"], fixed_last_date=DEFAULT_FIXED_LAST_DATE, store=store,
+                              analysis_workers=analysis_workers, tagger=tagger, analysis_cache_file=analysis_cache_file).get_all_articles()
+
+    rs = []
+
+    def stage(name, func):
+        result, seconds, peak_mb = measure(func, memory)
+        rs.append((name, seconds, peak_mb))
+        return result
+
+    stage("get_all_articles (cold)", get_all_articles)
+    articles_dict = stage("get_all_articles (cached)", get_all_articles)
+    markdowns = stage("load_markdown", lambda: [store.load_markdown(article_id) for article_id in manifest["article_ids"]])
+    documents = stage("parse_markdown", lambda: [parse_markdown(markdown_text) for markdown_text in markdowns])
+    stage("page_analyzer", lambda: [page_analyzer(document, tagger=tagger) for document in documents])
+    stage("counts", lambda: [counts(document["words"], keep_lists=False) for document in documents])
+    stage("pos_tagger", lambda: [pos_tagger(document["words"], tagger=tagger) for document in documents])
+    dataset = stage("build_graph (mixed)", lambda: build_graph(articles_dict, isolate_articles=False))
+    stage("build_graph (isolated)", lambda: build_graph(articles_dict, isolate_articles=True))
+    stage("write_html", lambda: write_html(dataset, os.path.join(output_path, username), user=username))
+    return rs
+
+
+def run_suite(bundled: bool = True, sizes: list = None, memory: bool = True, tagger: str = DEFAULT_TAGGER, analysis_workers: int = 1,
+              results_file: str = DEFAULT_RESULTS_FILE) -> str:
+    """
+    Benchmark the bundled data/*.pickle profiles and synthetic profiles of <sizes> articles (offline, without ChatGPT).
+    Every profile is imported to a temporary store with an empty analysis cache. Results are appended to <results_file>,
+    returns the run id.
+    """
+    load_resources()
+    run = {"run_id": uuid.uuid4().hex[0:12], "created_at": datetime.now().isoformat(), "commit": git_commit(),
+           "python": platform.python_version(), "tagger": tagger, "analysis_workers": analysis_workers, "traced_memory": memory}
+    pickle_files = sorted(glob('data/*_[0-9]*.pickle'))
+    os.makedirs(os.path.dirname(results_file) or '.', exist_ok=True)
+
+    print(f"{'profile':<25}{'articles':>9}{'links':>8}  {'stage':<26}{'seconds':>10}{'peak (MB)':>11}")
+    with tempfile.TemporaryDirectory() as store_path, tempfile.TemporaryDirectory() as output_path:
+        profiles = []
+        if bundled:
+            for file_name in pickle_files:
+                migrate_pickle(file_name, path=store_path)
+                profiles.append(os.path.basename(file_name).rsplit('_', 1)[0])
+
+        source_articles = [article for file_name in pickle_files for article in load_pickle(file_name)["articles"]]
+        for articles_num in sizes or []:
+            profile = synthetic_profile(articles_num, source_articles)
+            store = ProfileStore(profile["user"]["id"], path=store_path)
+            store.import_articles(profile["articles"])
+            store.save_manifest(profile["user"], [article["id"] for article in profile["articles"]])
+            profiles.append(profile["user"]["id"])
+
+        with open(results_file, 'a', encoding='utf8') as f:
+            for username in profiles:
+                store = ProfileStore(username, path=store_path)
+                article_ids = store.load_manifest()["article_ids"]
+                links_num = sum(len(store.load_article(article_id)["links"]) for article_id in article_ids)
+                for stage, seconds, peak_mb in run_profile(username, store_path, output_path, memory, tagger, analysis_workers):
+                    peak = f"{peak_mb:>11.1f}" if peak_mb is not None else f"{'-':>11}"
+                    print(f"{username:<25}{len(article_ids):>9}{links_num:>8}  {stage:<26}{seconds:>10.3f}{peak}")
+                    f.write(json.dumps({**run, "profile": username, "articles": len(article_ids), "links": links_num, "stage": stage,
+                                        "seconds": seconds, "peak_mb": peak_mb}) + "\n")
+                    f.flush()
+    return run["run_id"]
+
+
+def load_results(results_file: str = DEFAULT_RESULTS_FILE) -> dict:
+    """
+    Returns {run_id: [result, ...]} in run order
+    """
+    runs = {}
+    with open(results_file, encoding='utf8') as f:
+        for line in f:
+            result = json.loads(line)
+            runs.setdefault(result["run_id"], []).append(result)
+    return runs
+
+
+def compare_runs(results_file: str = DEFAULT_RESULTS_FILE, run_id: str = None, baseline_run_id: str = None):
+    """
+    Compare the stage times and peak memory of a run (the last by default) with a baseline run (by default the previous run
+    with the same settings, memory tracing slows down the stages)
+    """
+    runs = load_results(results_file)
+    run_ids = list(runs)
+    run_id = run_id or run_ids[-1]
+    if baseline_run_id is None:
+        settings = itemgetter("tagger", "analysis_workers", "traced_memory")
+        previous = [x for x in run_ids[0:run_ids.index(run_id)] if settings(runs[x][0]) == settings(runs[run_id][0])]
+        if not previous:
+            print(f"no run before {run_id} with the same settings to compare with")
+            return
+        baseline_run_id = previous[-1]
+
+    baseline = {(result["profile"], result["stage"]): result for result in runs[baseline_run_id]}
+    print(f"\n{baseline_run_id} ({runs[baseline_run_id][0]['commit']}) -> {run_id} ({runs[run_id][0]['commit']})")
+    print(f"{'profile':<25}{'stage':<26}{'before (s)':>11}{'after (s)':>11}{'change':>9}{'peak MB before/after':>22}")
+    for result in runs[run_id]:
+        before = baseline.get((result["profile"], result["stage"]))
+        if not before:
+            continue
+        change = (result["seconds"] - before["seconds"]) / before["seconds"] if before["seconds"] else 0
+        peak = "/".join(f"{x['peak_mb']:.1f}" if x['peak_mb'] is not None else "-" for x in [before, result])
+        print(f"{result['profile']:<25}{result['stage']:<26}{before['seconds']:>11.3f}{result['seconds']:>11.3f}{change:>+9.0%}{peak:>22}")
+
+
+if __name__ == "__main__":
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--sizes", type=str, default=DEFAULT_SIZES, help="comma separated sizes of synthetic profiles (empty for none)")
+    parser.add_argument("-nb", "--no-bundled", action="store_true", help="skip the bundled data/*.pickle profiles")
+    parser.add_argument("-nm", "--no-memory", action="store_true", help="do not trace peak memory (tracing slows down the stages)")
+    parser.add_argument("-t", "--tagger", choices=TAGGERS.keys(), default=DEFAULT_TAGGER, help="part-of-speech tagger")
+    parser.add_argument("-aw", "--analysis-workers", type=int, default=1, help="number of processes used to analyze articles")
+    parser.add_argument("-o", "--output", type=str, default=DEFAULT_RESULTS_FILE, help="jsonl file the results are appended to")
+    parser.add_argument("-c", "--compare", action="store_true", help="only compare the last run with the previous run")
+    parser.add_argument("-b", "--baseline", type=str, default=None, help="run id to compare with (default the previous run)")
+    args = parser.parse_args()
+
+    if not args.compare:
+        sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+        run_suite(bundled=not args.no_bundled, sizes=sizes, memory=not args.no_memory, tagger=args.tagger,
+                  analysis_workers=args.analysis_workers, results_file=args.output)
+    if os.path.exists(args.output):
+        compare_runs(args.output, baseline_run_id=args.baseline)
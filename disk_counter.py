@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import tempfile
+
+from links import Link
+from text_analyzer import ProfileCounter
+
+# Counters of ProfileCounter kept on disk, by the article stats they are summed from
+KINDS = {"word": "word_counts", "bigram": "bigram_counts", "trigram": "trigram_counts"}
+
+
+def term_key(key) -> str:
+    return ' '.join(key) if isinstance(key, tuple) else key
+
+
+class DiskProfileCounter(ProfileCounter):
+    """
+    ProfileCounter for large profiles: word, bigram and trigram counts (and unique words) are summed in a temporary
+    SQLite file instead of memory, so they do not grow with the number of articles. Ties are ordered by first
+    appearance (the rowid of a term), as in Counter.most_common, so the summary is the same as ProfileCounter.summary().
+    """
+
+    def __init__(self, directory: str = None):
+        super().__init__()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd, self.file_name = tempfile.mkstemp(dir=directory, prefix='profile_counter_', suffix='.sqlite')
+        os.close(fd)
+        self.connection = sqlite3.connect(self.file_name)
+        # Temporary data, durability is not needed
+        self.connection.execute("PRAGMA journal_mode=OFF")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        self.connection.execute("""CREATE TABLE terms (
+                                   kind TEXT NOT NULL,
+                                   term TEXT NOT NULL,
+                                   count INTEGER NOT NULL,
+                                   upa INTEGER NOT NULL,
+                                   UNIQUE (kind, term))""")
+        self.connection.execute("CREATE TABLE words (word TEXT PRIMARY KEY)")
+
+    def add(self, stats: dict):
+        for kind, field in KINDS.items():
+            self.connection.executemany("""INSERT INTO terms VALUES (?, ?, ?, 1)
+                                           ON CONFLICT (kind, term) DO UPDATE SET count = count + excluded.count, upa = upa + 1""",
+                                        [(kind, term_key(key), value) for key, value in stats[field].items()])
+        self.connection.executemany("INSERT OR IGNORE INTO words VALUES (?)", [(word,) for word in stats["unique_words_all"]])
+        self.pos_stats.update({pos: stats[pos] for pos in ["adj", "noun", "verb"]})
+        self.words_num_all += stats["words_num_all"]
+        self.words_num += stats["words_num"]
+
+    def most_common(self, kind: str, column: str, top: int) -> list:
+        return self.connection.execute(f"SELECT term, {column} FROM terms WHERE kind = ? ORDER BY {column} DESC, rowid LIMIT ?",
+                                       (kind, top)).fetchall()
+
+    def summary(self) -> dict:
+        self.connection.commit()
+        return {
+            "words_counts": {"most_common_words": self.most_common("word", "count", 30),
+                             "most_common_bigrams": self.most_common("bigram", "count", 15),
+                             "most_common_trigrams": self.most_common("trigram", "count", 10)},
+            "words_upa_counts": {"most_common_words": self.most_common("word", "upa", 30),
+                                 "most_common_bigrams": self.most_common("bigram", "upa", 15),
+                                 "most_common_trigrams": self.most_common("trigram", "upa", 10)},
+            "pos_stats": {pos: self.pos_stats[pos] for pos in ["adj", "noun", "verb"]},
+            "words_num_all": self.words_num_all,
+            "unique_words_num_all": self.connection.execute("SELECT COUNT(*) FROM words").fetchone()[0],
+            "words_num": self.words_num,
+            "unique_words_num": self.connection.execute("SELECT COUNT(*) FROM terms WHERE kind = 'word'").fetchone()[0],
+        }
+
+    def close(self):
+        self.connection.close()
+        os.remove(self.file_name)
+
+
+class DiskArticles:
+    """
+    Summarized articles of a large profile kept in a temporary file (a json line per article) instead of memory.
+    Only the fields used to build the graph are kept (see kgraph.build_graph()), articles are read back one at a time
+    every time they are iterated. Pickled as the file name (e.g. to return a profile from a batch.run_merged() process),
+    the file is deleted by close().
+    """
+
+    def __init__(self, directory: str = None):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd, self.file_name = tempfile.mkstemp(dir=directory, prefix='profile_articles_', suffix='.jsonl')
+        self.file = os.fdopen(fd, 'w+b')
+        self.articles_num = 0
+
+    def __getstate__(self) -> dict:
+        self.file.flush()
+        return {"file_name": self.file_name, "articles_num": self.articles_num}
+
+    def __setstate__(self, state: dict):
+        self.file_name = state["file_name"]
+        self.articles_num = state["articles_num"]
+        self.file = open(self.file_name, 'r+b')
+
+    def append(self, article: dict):
+        record = {"id": article["id"], "url": article["url"], "voter_count": article["voter_count"], "stats": article["stats"],
+                  "stats_dict": {"h1": article["stats_dict"]["h1"], "h2": article["stats_dict"]["h2"]},
+                  "normalized_links": article["normalized_links"]}
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(json.dumps(record, separators=(',', ':')).encode("utf8") + b"\n")
+        self.articles_num += 1
+
+    def __len__(self) -> int:
+        return self.articles_num
+
+    def __iter__(self):
+        # Keep the position of this iteration, so that appending or another iteration does not move it
+        position = 0
+        while True:
+            self.file.seek(position)
+            line = self.file.readline()
+            if not line:
+                return
+            position = self.file.tell()
+            record = json.loads(line)
+            record["normalized_links"] = [Link(*link) for link in record["normalized_links"]]
+            yield record
+
+    def close(self):
+        self.file.close()
+        # A pickled copy of the articles may have deleted the file already
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+
+def close_articles(articles_dict: dict):
+    """
+    Delete the articles file of a profile summarized with bounded_memory=True (see DiskArticles), once its graph is built
+    """
+    if isinstance(articles_dict["articles"], DiskArticles):
+        articles_dict["articles"].close()
@@ -0,0 +1,211 @@
+import argparse
+import json
+import pickle
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from glob import glob
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Date format of Medium ld+json dates (see get_data.get_timestamp())
+LD_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def ld_date(timestamp: dict) -> str:
+    if not timestamp.get("date"):
+        return None
+    return datetime.combine(timestamp["date"], timestamp["time"]).strftime(LD_DATE_FORMAT)
+
+
+def article_html(article: dict) -> str:
+    """
+    Build a Medium-like article page (ld+json and __APOLLO_STATE__ scripts) from a cached article
+    """
+    ld = {"identifier": article["id"], "name": article.get("name", ""), "isAccessibleForFree": article.get("isAccessibleForFree", True),
+          "publisher": {"name": article.get("publisher_name", ""), "url": article.get("publisher_url", "")}}
+    for key, field in [("dateCreated", "created_at"), ("datePublished", "published_at"), ("dateModified", "modified_at")]:
+        if article.get(field):
+            ld[key] = ld_date(article[field])
+    paragraphs = {f'Paragraph:{article["id"]}_{i}': {"text": line, "markups": []}
+                  for i, line in enumerate(article["markdown"].splitlines()) if line}
+    apollo_state = {f'Post:{article["id"]}': {"clapCount": article.get("clap_count", 0), "voterCount": article.get("voter_count", 0),
+                                               "postResponses": {"count": article.get("post_responses", 0)}}, **paragraphs}
+    return f"""<html><head>
+        <script type="application/ld+json">{json.dumps(ld)}</script>
+        <script>window.__APOLLO_STATE__ = {json.dumps(apollo_state)}</script>
+        </head><body></body></html>"""
+
+
+class FakeMedium:
+    """
+    Users and articles of the bundled data/<username>_<n>.pickle files, served as the RapidAPI Medium endpoints and Medium article pages
+    """
+
+    def __init__(self, pattern: str = 'data/*.pickle'):
+        self.user_ids = {}
+        self.users = {}
+        self.user_articles = {}
+        self.articles = {}
+        for file_name in sorted(glob(pattern)):
+            with open(file_name, 'rb') as f:
+                data = pickle.load(f)
+            user_id = data["user"]["id"]
+            self.user_ids[data["user"]["info"]["username"]] = user_id
+            self.users[user_id] = data["user"]["info"]
+            # Keep the largest pickle of a user
+            if len(data["articles"]) >= len(self.user_articles.get(user_id, [])):
+                self.user_articles[user_id] = [article["id"] for article in data["articles"]]
+            self.articles.update({article["id"]: article for article in data["articles"]})
+
+    def route(self, path: str) -> tuple:
+        """
+        Returns (status, content type, body) of a path
+        """
+        routes = [
+            (r'/user/id_for/([^/]+)', lambda username: {"id": self.user_ids[username]}),
+            (r'/user/([^/]+)/articles', lambda user_id: {"associated_articles": self.user_articles[user_id]}),
+            (r'/user/([^/]+)', lambda user_id: self.users[user_id]),
+            (r'/article/([^/]+)/markdown', lambda article_id: {"markdown": self.articles[article_id]["markdown"]}),
+        ]
+        try:
+            for pattern, handler in routes:
+                match = re.fullmatch(pattern, path)
+                if match:
+                    return 200, 'application/json', json.dumps(handler(match.group(1))).encode('utf8')
+            # Article pages, /<user_id>/<article_id> (see MEDIUM_ARTICLE_URL in get_data)
+            match = re.fullmatch(r'/([^/]+)/([^/]+)', path)
+            if match:
+                return 200, 'text/html; charset=utf-8', article_html(self.articles[match.group(2)]).encode('utf8')
+        except KeyError:
+            pass
+        return 404, 'application/json', b'{"error": "not found"}'
+
+
+class FaultInjector:
+    """
+    Add <latency> seconds (+-<jitter>) to every response, fail <error_rate> of the requests with 500 and <throttle_rate> with 429.
+    Requests above <max_rps> per second are also throttled with 429 and a Retry-After header.
+    """
+
+    def __init__(self, latency: float = 0, jitter: float = 0, error_rate: float = 0, throttle_rate: float = 0, max_rps: float = 0,
+                 retry_after: float = 1, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.window = []
+        self.lock = threading.Lock()
+
+    def fault(self) -> int:
+        """
+        Sleep for the latency and return the status to fail with (None for no failure)
+        """
+        with self.lock:
+            delay = max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0)
+            draw = self.random.random()
+            throttled = False
+            if self.max_rps:
+                now = time.monotonic()
+                self.window = [x for x in self.window if now - x < 1]
+                throttled = len(self.window) >= self.max_rps
+                if not throttled:
+                    self.window.append(now)
+        time.sleep(delay)
+        if throttled or draw < self.throttle_rate:
+            return 429
+        if draw < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+
+def make_server(medium: FakeMedium, faults: FaultInjector = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                verbose: bool = False) -> ThreadingHTTPServer:
+    """
+    Create the fake server (call serve_forever(), e.g. in a thread). Request counts per status are kept in server.stats.
+    """
+    faults = faults or FaultInjector()
+    stats = {}
+    stats_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep connections alive, as Medium and RapidAPI do
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            status = faults.fault()
+            if status:
+                content_type, body = 'application/json', json.dumps({"error": status}).encode('utf8')
+            else:
+                status, content_type, body = medium.route(self.path.split("?")[0])
+
+            with stats_lock:
+                stats[status] = stats.get(status, 0) + 1
+
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if status == 429:
+                self.send_header("Retry-After", str(faults.retry_after))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.stats = stats
+    return server
+
+
+def start_server(medium: FakeMedium, faults: FaultInjector = None, host: str = DEFAULT_HOST, port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the fake server in a background thread (port 0 picks a free port), stop it with server.shutdown()
+    """
+    server = make_server(medium, faults, host=host, port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def server_urls(server: ThreadingHTTPServer) -> dict:
+    """
+    Environment variables that point get_data to the server
+    """
+    host, port = server.server_address[0:2]
+    return {"MEDIUM_API_URL": f"http://{host}:{port}", "MEDIUM_ARTICLE_URL": f"http://{host}:{port}/{{user_id}}/{{article_id}}"}
+
+
+if __name__ == "__main__":
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help="host to listen on")
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("-lt", "--latency", type=float, default=0, help="response latency in ms")
+    parser.add_argument("-j", "--jitter", type=float, default=0, help="random latency jitter in ms (+-)")
+    parser.add_argument("-er", "--error-rate", type=float, default=0, help="share of requests failing with 500")
+    parser.add_argument("-tr", "--throttle-rate", type=float, default=0, help="share of requests failing with 429")
+    parser.add_argument("-rps", "--max-rps", type=float, default=0, help="requests per second above which requests fail with 429 (0 for no limit)")
+    parser.add_argument("-ra", "--retry-after", type=float, default=1, help="Retry-After seconds of 429 responses")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    fake_medium = FakeMedium()
+    fake_server = make_server(fake_medium, FaultInjector(latency=args.latency / 1000, jitter=args.jitter / 1000, error_rate=args.error_rate,
+                                                         throttle_rate=args.throttle_rate, max_rps=args.max_rps, retry_after=args.retry_after),
+                              host=args.host, port=args.port, verbose=args.verbose)
+    print(f"serving {len(fake_medium.users)} users and {len(fake_medium.articles)} articles, point get_data to the server with:")
+    for name, value in server_urls(fake_server).items():
+        print(f"{name}={value}")
+    try:
+        fake_server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nresponses per status: {fake_server.stats}")
@@ -1,17 +1,22 @@
-import requests
 import bs4
-from text_analyzer import page_analyzer, stats_to_text, counts, profile_to_text, pos_tagger, chatgpt_parser
+from text_analyzer import stats_to_text, profile_to_text, ProfileCounter, ArticleCounter, chatgpt_enrich, chatgpt_document, chatgpt_response_cache, \
+    analyze_markdown, analyze_markdowns, load_resources, compact_stats, ChatGPTBudget, CHATGPT_WORKERS, CHATGPT_RPM, CHATGPT_TPM, DEFAULT_TAGGER, analyzer_key
 import re
-import markdown
-import backoff
-import pickle
 from dotenv import load_dotenv
 import os
 from subprocess import check_output
 import json
-import validators
-from datetime import datetime
-import os
+from datetime import datetime, timedelta, date
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import tempfile
+from glob import glob, escape as glob_escape
+from http_client import HttpClient
+from article_store import ProfileStore, migrate_pickle, LEGACY_PICKLE_RE
+from analysis_cache import AnalysisCache, DEFAULT_CACHE_FILE as DEFAULT_ANALYSIS_CACHE_FILE
+from links import normalize_links, is_valid_url
+from instrumentation import timed, timer, count
+from pipeline import Stage, run_pipeline, DEFAULT_QUEUE_SIZE
+from disk_counter import DiskProfileCounter, DiskArticles
 
 # load environment variables from .env file
 load_dotenv()
@@ -19,14 +24,21 @@ load_dotenv()
 INLINE_LINK_RE = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
 FOOTNOTE_LINK_TEXT_RE = re.compile(r'\[([^\]]+)\]\[(\d+)\]')
 FOOTNOTE_LINK_URL_RE = re.compile(r'\[(\d+)\]:\s+(\S+)')
+JS_UNDEFINED_RE = re.compile(r'(?<=[:\[,])\s*undefined(?=\s*[,}\]])')
+JSON_DECODER = json.JSONDecoder()
 
-API_URL = "https://medium2.p.rapidapi.com"
+# Point to another (e.g. local fake, see fake_server.py) RapidAPI Medium endpoint and article pages
+API_URL = os.environ.get('MEDIUM_API_URL', "https://medium2.p.rapidapi.com")
+ARTICLE_URL = os.environ.get('MEDIUM_ARTICLE_URL', "https://{user_id}.medium.com/{article_id}")
 
 HEADERS = {
     "X-RapidAPI-Key": os.environ.get('RAPID_API'),
     "X-RapidAPI-Host": "medium2.p.rapidapi.com"
 }
 
+# Client used when no client is given
+DEFAULT_CLIENT = HttpClient()
+
 
 def get_ld_json(soup) -> dict:
     return json.loads("".join(soup.find("script", {"type": "application/ld+json"}).contents))
@@ -83,27 +95,59 @@ def find_md_links(md: str) -> list:
     return links
 
 
-def load_js_state(soup, state: str = 'window.__PRELOADED_STATE__') -> dict:
+def find_js_state_script(soup, state: str) -> str:
+    """
+    Find the body of the script that assigns <state>
+    """
+    return [x for x in soup.find_all('script') if state in str(x)][0].text.strip()
+
+
+@timed("js_state_node")
+def load_js_state_node(soup, state: str = 'window.__PRELOADED_STATE__') -> dict:
     """
-    Load JS state from a soup object
+    Load JS state from a soup object by evaluating the script with node
     """
-    s = [x for x in soup.find_all('script') if state in str(x)][0]
-    with open('temp.js', 'w', encoding="utf-8") as f:
+    script = find_js_state_script(soup, state)
+    with tempfile.NamedTemporaryFile('w', suffix='.js', encoding="utf-8", delete=False) as f:
         f.write('window = {};\n' +
-                s.text.strip() +
+                script +
                 f';\nprocess.stdout.write(JSON.stringify({state}));')
-    window_init_state = check_output(['node', 'temp.js'])
-    os.remove('temp.js')
+    try:
+        window_init_state = check_output(['node', f.name])
+    finally:
+        os.remove(f.name)
     rs = json.loads(window_init_state)
     return rs
 
 
-def get_user_id_unofficial(user: str) -> dict:
+@timed("js_state")
+def load_js_state(soup, state: str = 'window.__PRELOADED_STATE__') -> dict:
+    """
+    Load JS state from a soup object.
+    Medium assigns states as object literals (window.__APOLLO_STATE__ = {...}) that are valid JSON,
+    so we decode them in-process. If the literal is not valid JSON (e.g. contains undefined) we retry after replacing
+    undefined with null and finally fall back to evaluating the script with node.
+    """
+    script = find_js_state_script(soup, state)
+    match = re.search(re.escape(state) + r'\s*=\s*', script)
+    if match:
+        literal = script[match.end():]
+        try:
+            return JSON_DECODER.raw_decode(literal)[0]
+        except json.JSONDecodeError:
+            try:
+                return JSON_DECODER.raw_decode(JS_UNDEFINED_RE.sub('null', literal))[0]
+            except json.JSONDecodeError:
+                pass
+    return load_js_state_node(soup, state=state)
+
+
+def get_user_id_unofficial(user: str, client: HttpClient = DEFAULT_CLIENT) -> dict:
     """
     Unofficial method to get user info
     """
     user_url = f"https://medium.com/@{user}"
-    response = requests.get(user_url, headers=HEADERS)
+    response = client.get(user_url, endpoint="user_page", headers=HEADERS)
     soup = bs4.BeautifulSoup(response.content, features="lxml")
     preload_state = load_js_state(soup, state='window.__PRELOADED_STATE__')
     user_id = preload_state['client']['routingEntity']['id']
@@ -112,15 +156,12 @@ def get_user_id_unofficial(user: str) -> dict:
     return {"user_id": user_id, "social_stats": social_stats}
 
 
-@backoff.on_exception(backoff.expo,
-                      requests.exceptions.RequestException,
-                      max_tries=3,
-                      jitter=None)
-def get_article_stats(url: str) -> list:
+@timed("fetch_article_stats")
+def get_article_stats(url: str, client: HttpClient = DEFAULT_CLIENT) -> list:
     """
     Unofficial method to get article stats.
     """
-    article_response = requests.get(url)
+    article_response = client.get(url, endpoint="article_page")
     soup = bs4.BeautifulSoup(article_response.content, features="lxml")
 
     ld = get_ld_json(soup)
@@ -147,12 +188,12 @@ def get_article_stats(url: str) -> list:
     return info
 
 
-def get_article_content_unofficial(url: str) -> list:
+def get_article_content_unofficial(url: str, client: HttpClient = DEFAULT_CLIENT) -> list:
     """
     Unofficial method to get article markdown. Only works with articles without a paywall
     """
     rs = []
-    article_response = requests.get(url)
+    article_response = client.get(url, endpoint="article_page")
     soup = bs4.BeautifulSoup(article_response.content, features="lxml")
 
     preload_state = load_js_state(soup, state='window.__APOLLO_STATE__')
@@ -170,189 +211,477 @@ def get_article_content_unofficial(url: str) -> list:
                 href = markup.get("href")
                 text = markups_text[start:end]
                 if href:
-                    if validators.url(href):
+                    if is_valid_url(href):
                         rs.append((text, href))
 
     return rs
 
 
-def get_user_id(user: str) -> str:
+def get_user_id(user: str, client: HttpClient = DEFAULT_CLIENT) -> str:
     """
     Get user_id using Medium API
     """
     url = f"{API_URL}/user/id_for/{user}"
-    response = requests.get(url, headers=HEADERS)
+    response = client.get(url, endpoint="user_id", headers=HEADERS)
     user_id = response.json()["id"]
     return user_id
 
 
-def get_user_info(user_id: str) -> dict:
+def get_user_info(user_id: str, client: HttpClient = DEFAULT_CLIENT) -> dict:
     """
     Get user_info using Medium API
     """
     url = f"{API_URL}/user/{user_id}"
-    response = requests.get(url, headers=HEADERS)
+    response = client.get(url, endpoint="user_info", headers=HEADERS)
     return response.json()
 
 
-def get_user_articles(user_id: str) -> list:
+def get_user_articles(user_id: str, client: HttpClient = DEFAULT_CLIENT) -> list:
     """
     Get user article_ids using Medium API
     """
     url = f"{API_URL}/user/{user_id}/articles"
-    response = requests.request("GET", url, headers=HEADERS)
+    response = client.get(url, endpoint="user_articles", headers=HEADERS)
     articles = response.json()['associated_articles']
     return articles
 
 
-def get_article_markdown(article_id: str) -> str:
+def get_article_markdown(article_id: str, client: HttpClient = DEFAULT_CLIENT) -> str:
     """
     Get article markdown using Medium API
     """
     url = f"{API_URL}/article/{article_id}/markdown"
-    response = requests.request("GET", url, headers=HEADERS)
+    response = client.get(url, endpoint="article_markdown", headers=HEADERS)
     return response.json()["markdown"]
 
 
-def get_article_content(article_id: str) -> dict:
-    markdown_text = get_article_markdown(article_id)
+@timed("fetch_article_content")
+def get_article_content(article_id: str, client: HttpClient = DEFAULT_CLIENT) -> dict:
+    markdown_text = get_article_markdown(article_id, client=client)
     links = find_md_links(markdown_text)
     return {"links": links, "markdown_text": markdown_text}
 
 
+def get_article(user_id: str, article_id: str, client: HttpClient = DEFAULT_CLIENT) -> dict:
+    """
+    Get article markdown, links and stats
+    """
+    print(f"getting article {article_id}...")
+    article_content = get_article_content(article_id, client=client)
+    article_stats = get_article_stats(ARTICLE_URL.format(user_id=user_id, article_id=article_id), client=client)
+
+    article_main = {
+        "id": article_id,
+        "links": article_content["links"],
+        "markdown": article_content["markdown_text"]
+    }
+    return {**article_main, **article_stats}
+
+
+def get_articles(user_id: str, article_ids: list, workers: int = 1, client: HttpClient = DEFAULT_CLIENT) -> list:
+    """
+    Get many articles using a pool of <workers> threads. Results keep the order of article_ids.
+    """
+    if workers <= 1:
+        return [get_article(user_id, article_id, client=client) for article_id in article_ids]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda article_id: get_article(user_id, article_id, client=client), article_ids))
+
+
+# Article stats that change after publishing
+VOLATILE_STATS = ["clap_count", "voter_count", "post_responses"]
+
+
+def refresh_article_stats(article: dict, client: HttpClient = DEFAULT_CLIENT) -> dict:
+    """
+    Update volatile stats (claps, voters, responses) of a downloaded article
+    """
+    print(f"refreshing stats of article {article['id']}...")
+    article_stats = get_article_stats(article["url"], client=client)
+    for key in VOLATILE_STATS:
+        article[key] = article_stats[key]
+    return article
+
+
 class MediumArticles:
-    def __init__(self, username: str, articles_limit: int = 0, reset: bool = False, fixed_last_date=False, use_gpt=False):
+    def __init__(self, username: str, articles_limit: int = 0, reset: bool = False, fixed_last_date=False, use_gpt=False, workers: int = 1,
+                 requests_per_second: float = 0, analysis_workers: int = 1, client: HttpClient = None, sync: bool = False,
+                 stats_ttl: float = 0, refresh_days: int = 30, store: ProfileStore = None, gpt_workers: int = CHATGPT_WORKERS,
+                 gpt_rpm: int = CHATGPT_RPM, gpt_tpm: int = CHATGPT_TPM, tagger: str = DEFAULT_TAGGER,
+                 analysis_cache_file: str = DEFAULT_ANALYSIS_CACHE_FILE, stream: bool = False, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 resume: bool = False, bounded_memory: bool = False, since=None, until=None):
         self.username = username
+        self.bounded_memory = bounded_memory
+        # Dates or YYYY-MM-DD strings
+        self.since = date.fromisoformat(since) if isinstance(since, str) else since
+        self.until = date.fromisoformat(until) if isinstance(until, str) else until
+        self.resume = resume
+        self.stream = stream
+        self.queue_size = queue_size
+        self.analysis_cache_file = analysis_cache_file
+        self.tagger = tagger
+        self.gpt_workers = gpt_workers
+        self.gpt_rpm = gpt_rpm
+        self.gpt_tpm = gpt_tpm
+        self.sync = sync
+        self.stats_ttl = stats_ttl
+        self.refresh_days = refresh_days
+        self.store = store or ProfileStore(username)
+        self.client = client or HttpClient(requests_per_second=requests_per_second, pool_size=max(workers, 1) * 2)
+        self.analysis_workers = analysis_workers
+        self.workers = workers
         self.fixed_last_date = fixed_last_date
         self.use_gpt = use_gpt
-        self.user_words = []
-        self.user_words_all = []
         self.articles_limit = articles_limit
         self.reset = reset
-        self.clap_count = []
-        self.voter_count = []
-        self.clap_voter_count = []
-        self.publication = []
-        self.published_at = []
-        self.article_length_cat = []
-        self.user_upa_words_all = []
-        self.user_upa_words = []
-        self.chatgpt_keywords = []
+
+    def import_pickles(self):
+        """
+        Migrate existing <username>_<articles_limit>.pickle files to the profile store, once per profile
+        """
+        if self.store.load_manifest() is not None:
+            return
+        for file_name in sorted(glob(f'data/{glob_escape(self.username)}_*.pickle')):
+            # Skip other pickles (e.g. <username>_backup.pickle) and users whose name starts with <username>_
+            match = LEGACY_PICKLE_RE.fullmatch(os.path.basename(file_name))
+            if not match or match.group("username") != self.username:
+                continue
+            print(f"imported {migrate_pickle(file_name, path=os.path.dirname(self.store.directory))} articles from {file_name}...")
+
+    def stored_articles(self, user: dict, article_ids: list) -> dict:
+        """
+        Articles from the profile store, without markdown (see ProfileStore.load_markdown()), with their links normalized once
+        (see links.normalize_links())
+        """
+        articles = [self.store.load_article(article_id) for article_id in article_ids]
+        for article in articles:
+            article["normalized_links"] = normalize_links(article["links"])
+        return {"user": user, "articles": articles}
+
+    def manifest_article_ids(self) -> tuple:
+        """
+        Returns (user, article_ids) of the manifest if it has the ids of the user's first <articles_limit> articles, else None
+        """
+        manifest = self.store.load_manifest()
+        if not manifest:
+            return None
+        article_ids = manifest["article_ids"][0:self.articles_limit] if self.articles_limit else manifest["article_ids"]
+        if not manifest["articles_limit"] or 0 < self.articles_limit <= manifest["articles_limit"]:
+            return manifest["user"], article_ids
+        return None
+
+    def stored_article_ids(self) -> tuple:
+        """
+        Returns (user, article_ids) if the profile store has the user's first <articles_limit> articles, else None
+        """
+        listed = self.manifest_article_ids()
+        if listed and all(self.store.has_article(article_id) for article_id in listed[1]):
+            return listed
+        return None
+
+    def sync_article_ids(self) -> tuple:
+        """
+        Get the user info and article ids from the API and save them to the profile store, returns (user, article_ids)
+        of the first <articles_limit> articles
+        """
+        # User id is kept in the store to save an api request
+        manifest = self.store.load_manifest()
+        user_id = manifest["user"]["id"] if manifest else get_user_id(self.username, client=self.client)
+        user_info = get_user_info(user_id, client=self.client)
+        article_ids = get_user_articles(user_id, client=self.client)
+        self.store.save_manifest({"id": user_id, "info": user_info}, article_ids)
+
+        if self.articles_limit:
+            article_ids = article_ids[0:self.articles_limit]
+        return {"id": user_id, "info": user_info}, article_ids
+
+    def is_stale(self, record: dict, now: datetime) -> bool:
+        """
+        If <stats_ttl> (hours) is set, stats of articles published in the last <refresh_days> days that were fetched more
+        than <stats_ttl> hours ago are stale
+        """
+        if not self.stats_ttl:
+            return False
+        published_at = record["article"]["published_at"]["date"]
+        is_recent = published_at and (now.date() - published_at).days <= self.refresh_days
+        return bool(is_recent) and now - record["stats_fetched_at"] > timedelta(hours=self.stats_ttl)
+
+    def fetch_article(self, user_id: str, article_id: str, now: datetime) -> dict:
+        """
+        Download an article that is not stored (or every article with reset=True), refresh its stats if they are stale
+        (see is_stale()) and save it to the profile store. Returns the stored article, with its links normalized.
+        """
+        if self.reset or not self.store.has_article(article_id):
+            self.store.save_article(get_article(user_id, article_id, client=self.client))
+        else:
+            record = self.store.load_article_record(article_id)
+            if self.is_stale(record, now):
+                article = refresh_article_stats(record["article"], client=self.client)
+                self.store.save_article(article, fetched_at=record["fetched_at"], stats_fetched_at=now)
+        article = self.store.load_article(article_id)
+        article["normalized_links"] = normalize_links(article["links"])
+        return article
+
+    def fetch_articles(self, user_id: str, article_ids: list) -> list:
+        """
+        Download new articles and refresh stale stats (see fetch_article()) using <workers> threads.
+        Every article is saved to the profile store as soon as it is downloaded, so if the run stops (an error, Ctrl-C or
+        the API quota) the downloaded articles are kept and the next run (or resume=True) downloads only the rest.
+        Returns the stored articles in the order of article_ids.
+        """
+        now = datetime.now()
+        new_article_ids = [article_id for article_id in article_ids if self.reset or not self.store.has_article(article_id)]
+        print(f"{len(new_article_ids)} new articles, {len(article_ids) - len(new_article_ids)} stored articles...")
+
+        executor = ThreadPoolExecutor(max_workers=max(self.workers, 1))
+        futures = [executor.submit(self.fetch_article, user_id, article_id, now) for article_id in article_ids]
+        try:
+            articles = [future.result() for future in futures]
+        except BaseException:
+            # Let running downloads finish (and be saved), cancel the others
+            executor.shutdown(cancel_futures=True)
+            stored = len([article_id for article_id in new_article_ids if self.store.has_article(article_id)])
+            print(f"stopped after downloading {stored} of {len(new_article_ids)} new articles, run again (or with --resume) to continue...")
+            raise
+        executor.shutdown()
+        self.client.print_stats()
+        return articles
+
+    def list_articles(self) -> tuple:
+        """
+        Returns (user, article_ids, all_stored) of the user's first <articles_limit> articles.
+        The article list of the profile store is used if the store has all the articles (unless sync=True or reset=True)
+        or, with resume=True, if it has the list of an interrupted download. Else the list is fetched from the API.
+        """
+        self.import_pickles()
+        stored = None if self.reset or self.sync else self.stored_article_ids()
+        if stored:
+            print("using the local store...")
+            return (*stored, True)
+
+        listed = self.manifest_article_ids() if self.resume and not self.reset else None
+        if listed:
+            print("resuming with the stored article list...")
+            return (*listed, False)
+
+        print("using the api...")
+        return (*self.sync_article_ids(), False)
+
+    def load_articles(self) -> dict:
+        """
+        If the profile store has the user's first <articles_limit> articles use the store else use the API
+        (except the case you specify reset=True), see list_articles().
+        """
+        user, article_ids, all_stored = self.list_articles()
+        if all_stored:
+            return self.stored_articles(user, article_ids)
+        return {"user": user, "articles": self.fetch_articles(user["id"], article_ids)}
+
+    def sync_articles(self) -> dict:
+        """
+        Incremental download using the profile store: fetch the user's article ids, download only articles
+        that are not stored and, if <stats_ttl> (hours) is set, refresh stats of articles published in the last
+        <refresh_days> days that were fetched more than <stats_ttl> hours ago.
+        """
+        print("syncing with the api...")
+        self.import_pickles()
+        user, article_ids = self.sync_article_ids()
+        return {"user": user, "articles": self.fetch_articles(user["id"], article_ids)}
+
+    def analyze_articles(self, articles: list) -> list:
+        """
+        Parse and analyze articles, returns (document, stats) per article.
+        Results are cached by markdown hash and analyzer version (see AnalysisCache), so only new or changed articles
+        are analyzed and their markdown loaded.
+        """
+        cache = AnalysisCache(analyzer_key(self.tagger), file_name=self.analysis_cache_file)
+        markdown_hashes = [self.store.markdown_hash(article["id"]) for article in articles]
+        results = cache.get_many(markdown_hashes)
+
+        missing = {}
+        for article, markdown_hash in zip(articles, markdown_hashes):
+            if markdown_hash not in results:
+                missing.setdefault(markdown_hash, article["id"])
+        print(f"{len(missing)} articles analyzed, {len(articles) - len(missing)} from the analysis cache...")
+        count("analysis_cache.misses", len(missing))
+        count("analysis_cache.hits", len(articles) - len(missing))
+        if missing:
+            with timer("load_markdown"):
+                markdowns = [self.store.load_markdown(article_id) for article_id in missing.values()]
+            with timer("analyze"):
+                new_results = dict(zip(missing.keys(), analyze_markdowns(markdowns, workers=self.analysis_workers, tagger=self.tagger)))
+            cache.put_many(new_results)
+            results.update(new_results)
+        cache.close()
+        return [results[markdown_hash] for markdown_hash in markdown_hashes]
+
+    def stream_articles(self, user: dict, article_ids: list):
+        """
+        Download, analyze and enrich articles as overlapping stages (see pipeline.run_pipeline()): <workers> threads download
+        articles and save each one to the profile store as soon as it arrives (see fetch_article()), <analysis_workers> processes
+        analyze them (unless their analysis is cached) while later articles are downloaded and <gpt_workers> threads request
+        ChatGPT keywords and summaries. Stages are connected by queues of <queue_size> articles, parsed documents are dropped
+        after the ChatGPT stage, so memory is bounded by the queues and not by the number of articles.
+        An article that fails is left out of the profile, the others are kept (and stored) and are not downloaded again
+        on the next run. Articles outside the <since>-<until> window are skipped (see in_window()). Yields (article, stats) in
+        article order.
+        """
+        print(f"streaming {len(article_ids)} articles...")
+        now = datetime.now()
+        self.store.load_tables()
+        cache = AnalysisCache(analyzer_key(self.tagger), file_name=self.analysis_cache_file)
+        response_cache = chatgpt_response_cache(self.username) if self.use_gpt else None
+        budget = ChatGPTBudget(requests_per_minute=self.gpt_rpm, tokens_per_minute=self.gpt_tpm)
+        executor = ProcessPoolExecutor(max_workers=self.analysis_workers, initializer=load_resources) if self.analysis_workers > 1 else None
+        def fetch(article_id: str) -> dict:
+            article = self.fetch_article(user["id"], article_id, now)
+            return article if self.in_window(article) else None
+
+        def analyze(article: dict) -> tuple:
+            markdown_hash = self.store.markdown_hash(article["id"])
+            result = cache.get_many([markdown_hash]).get(markdown_hash)
+            if result is None:
+                count("analysis_cache.misses")
+                markdown_text = self.store.load_markdown(article["id"])
+                with timer("analyze"):
+                    if executor:
+                        result = executor.submit(analyze_markdown, markdown_text, tagger=self.tagger).result()
+                    else:
+                        result = analyze_markdown(markdown_text, tagger=self.tagger)
+                cache.put_many({markdown_hash: result})
+            else:
+                count("analysis_cache.hits")
+            document, stats = result
+            return article, document["words"], stats
+
+        def enrich(analyzed: tuple) -> tuple:
+            article, words, stats = analyzed
+            if self.use_gpt:
+                article["chatgpt"] = chatgpt_document(article["id"], words, response_cache, budget=budget)
+            else:
+                article["chatgpt"] = {"keywords": [], "summary": "", "unikeywords": []}
+            return article, stats
+
+        stages = [Stage("fetch", fetch, workers=self.workers),
+                  Stage("analyze", analyze, workers=self.analysis_workers),
+                  Stage("enrich", enrich, workers=self.gpt_workers if self.use_gpt else 1)]
+        failed = {}
+        done = 0
+        try:
+            for index, result in run_pipeline(article_ids, stages, queue_size=self.queue_size, ordered=True):
+                if isinstance(result, Exception):
+                    print(f"article {article_ids[index]} failed: {result}")
+                    failed[article_ids[index]] = result
+                elif result is not None:
+                    done += 1
+                    yield result
+        except BaseException:
+            stored = len([article_id for article_id in article_ids if self.store.has_article(article_id)])
+            print(f"stopped with {stored} of {len(article_ids)} articles stored, run again (or with --resume) to continue...")
+            raise
+        finally:
+            if executor:
+                executor.shutdown()
+            cache.close()
+            if response_cache:
+                response_cache.close()
+
+        if failed and not done:
+            raise next(iter(failed.values()))
+        if failed:
+            print(f"{len(failed)} articles failed and are left out of the profile, they are retried on the next run...")
+        self.client.print_stats()
+
+    def in_window(self, article: dict) -> bool:
+        """
+        If <since> or <until> (dates) are set, only articles published in between are analyzed
+        """
+        published_at = article["published_at"]["date"]
+        if not self.since and not self.until:
+            return True
+        if not published_at:
+            return False
+        return (not self.since or published_at >= self.since) and (not self.until or published_at <= self.until)
 
     def get_all_articles(self) -> dict:
         """
         Get all user's articles and analyze them.
-        If pickle file with data exists use the file else use the API (except the case you specify reset=True).
-        File has the following format <username>_<articles_limit>.
-        If <articles_limit>=0 then download all articles.
+        By default stored articles are used when the profile store has them (see load_articles()), with sync=True
+        the article list is always synced with the API (see list_articles()). Every article is saved as soon as it is
+        downloaded, so an interrupted run is resumed by the next one (see fetch_articles()).
+        If <articles_limit>=0 then download all articles, only articles published between <since> and <until> are kept.
         Articles are saved before any NLP analysis (page_analyzer()) so you can adjust page_analyzer() to your needs.
+        Articles are downloaded by <workers> threads, limited to <requests_per_second> per host (0 for no limit),
+        using <client> (by default an HttpClient with connection pooling and retries).
+        Articles are analyzed by <analysis_workers> processes, using the <tagger> part-of-speech tagger (see text_analyzer.TAGGERS),
+        unless their analysis is cached (see analyze_articles()).
+        ChatGPT keywords and summaries are requested by <gpt_workers> threads within <gpt_rpm> requests and <gpt_tpm> tokens per minute.
+        With stream=True these steps overlap instead of running one after the other (see stream_articles()).
+        With bounded_memory=True (large profiles, implies stream=True) articles are summarized as they leave the stream, profile
+        word counts and the summarized articles are kept on disk (see disk_counter.DiskProfileCounter and DiskArticles, the caller
+        deletes the articles file with disk_counter.close_articles() once the graph is built).
         """
-        file_name = f'data/{self.username}_{self.articles_limit}.pickle'
-        # If file exists, load data from file
-        print(file_name)
-        if os.path.exists(file_name) and not self.reset:
-            print("using the local file...")
-            with open(file_name, 'rb') as f:
-                data_to_keep = pickle.load(f)
-        # If file does not exist, use Medium API
-        else:
-            print("using the api...")
-            # Get user info
-            user_id = get_user_id(self.username)
-            user_info = get_user_info(user_id)
-            article_ids = get_user_articles(user_id)
-
-            # Parse articles
-            data_to_keep = dict()
-            data_to_keep["user"] = {"id": user_id, "info": user_info}
-            data_to_keep["articles"] = []
-
-            main_counter = 1
-            for article_id in article_ids:
-                print(f"getting article {article_id}...")
-                article_content = get_article_content(article_id)
-                article_stats = get_article_stats(f"https://{user_id}.medium.com/{article_id}")
-
-                article_main = {
-                    "id": article_id,
-                    "links": article_content["links"],
-                    "markdown": article_content["markdown_text"]
-                }
-
-                data_to_keep["articles"].append({**article_main, **article_stats})
-
-                if self.articles_limit:
-                    if main_counter >= self.articles_limit:
-                        break
-                main_counter += 1
-
-            with open(file_name, 'wb') as f:
-                pickle.dump(data_to_keep, f)
+        if self.stream or self.bounded_memory:
+            with timer("stream_articles"):
+                user, article_ids, _ = self.list_articles()
+                if self.bounded_memory:
+                    profile_counter = DiskProfileCounter(os.path.dirname(self.analysis_cache_file))
+                    articles = DiskArticles(os.path.dirname(self.analysis_cache_file))
+                else:
+                    profile_counter = ProfileCounter()
+                    articles = None
+                try:
+                    return self.summarize_profile(user, self.stream_articles(user, article_ids), profile_counter, articles)
+                except BaseException:
+                    if self.bounded_memory:
+                        articles.close()
+                    raise
+                finally:
+                    if self.bounded_memory:
+                        profile_counter.close()
+
+        with timer("load_articles"):
+            data_to_keep = self.load_articles()
+            data_to_keep["articles"] = [article for article in data_to_keep["articles"] if self.in_window(article)]
+
+        # Parse and analyze each article once, the parsed documents are shared by ChatGPT and NLP analysis
+        analyzed = self.analyze_articles(data_to_keep["articles"])
 
         # Generate keywords and summary using ChatGPT
-        for article_content in data_to_keep["articles"]:
-            if self.use_gpt:
-                html = markdown.markdown(article_content["markdown"])
-                soup = bs4.BeautifulSoup(html, features="lxml")
-                article_content["chatgpt"] = chatgpt_parser(article_id=article_content["id"], soup=soup, username=self.username)
-            else:
+        if self.use_gpt:
+            response_cache = chatgpt_response_cache(self.username)
+            gpt_documents = [(article_content["id"], document["words"]) for article_content, (document, stats) in zip(data_to_keep["articles"], analyzed)]
+            budget = ChatGPTBudget(requests_per_minute=self.gpt_rpm, tokens_per_minute=self.gpt_tpm)
+            for article_content, chatgpt in zip(data_to_keep["articles"], chatgpt_enrich(gpt_documents, response_cache, workers=self.gpt_workers, budget=budget)):
+                article_content["chatgpt"] = chatgpt
+            response_cache.close()
+        else:
+            for article_content in data_to_keep["articles"]:
                 article_content["chatgpt"] = {"keywords": [], "summary": "", "unikeywords": []}
 
-        # Analyze articles
-        most_voters = 0
-        for article_content in data_to_keep["articles"]:
-            html = markdown.markdown(article_content["markdown"])
-            soup = bs4.BeautifulSoup(html, features="lxml")
-            stats = page_analyzer(soup)
-            article_content["stats_dict"] = stats
-            article_content["stats"] = stats_to_text(article_stats=stats, article_chars=article_content, user_chars=data_to_keep["user"])
-
-            self.user_words_all.extend(stats["words_all"])
-            self.user_words.extend(stats["words"])
-
-            self.user_upa_words_all.extend(list(set(stats["words_all"])))
-            self.user_upa_words.extend(list(set(stats["words"])))
-
-            self.clap_count.append(article_content["clap_count"])
-            self.voter_count.append(article_content["voter_count"])
-            self.article_length_cat.append(stats["words_num_cat"])
-            self.publication.append(article_content["publisher_name"])
-            self.published_at.append(article_content["published_at"])
-            self.chatgpt_keywords.append(article_content["chatgpt"]["unikeywords"])
-
-            # Find top article based on voters count (unique claps)
-            if article_content["voter_count"] > most_voters:
-                top_article = (article_content["url"], article_content["stats_dict"]["h1"], article_content["publisher_name"])
-                most_voters = article_content["voter_count"]
-
-        # Aggregate Statistics
-        pos_stats = pos_tagger(self.user_words_all)
-
-        # ChatGPT Most Common Words
-        total_chatgpt_keywords = []
-        for x in self.chatgpt_keywords:
-            total_chatgpt_keywords.extend(x)
-        chatgpt_words_count = counts(total_chatgpt_keywords)["most_common_words"]
-
-        words_counts = counts(self.user_words, include_stemming=False)
-        words_upa_counts = counts(self.user_upa_words, include_stemming=False)
-
-        profile_stats = {
-            "top_article": top_article,
-            "user_words_all": self.user_words_all,
-            "user_words": self.user_words,
-            "user_upa_words_all": self.user_upa_words_all,
-            "user_upa_words": self.user_upa_words,
-            "clap_count": self.clap_count,
-            "voter_count": self.voter_count,
-            "publication": self.publication,
-            "published_at": self.published_at,
-            "article_length_cat": self.article_length_cat,
-            "pos_stats": pos_stats,
-            "chatgpt_words_count": chatgpt_words_count,
-            "words_counts": words_counts,
-            "words_upa_counts": words_upa_counts,
-        }
+        return self.summarize_profile(data_to_keep["user"], zip(data_to_keep["articles"], [stats for document, stats in analyzed]), ProfileCounter())
+
+    def summarize_profile(self, user: dict, analyzed, profile_counter: ProfileCounter, articles=None) -> dict:
+        """
+        Add the stats of each article and the profile stats, from (article, stats) of the analyzed articles in article order.
+        Articles are summarized one at a time and appended to <articles> (a list by default), with bounded_memory=True only
+        compact stats are kept (see compact_stats()).
+        """
+        data_to_keep = {"user": user, "articles": [] if articles is None else articles}
+        article_counter = ArticleCounter(followers=user["info"]["followers_count"])
+        for article_content, stats in analyzed:
+            article_content["stats"] = stats_to_text(article_stats=stats, article_chars=article_content, user_chars=user)
+            article_content["stats_dict"] = compact_stats(stats) if self.bounded_memory else stats
+            data_to_keep["articles"].append(article_content)
+
+            profile_counter.add(stats)
+            article_counter.add(article_content, stats)
+
+        if not article_counter.articles_num:
+            raise ValueError(f"no articles of {self.username} to analyze")
+
+        profile_stats = {**profile_counter.summary(), **article_counter.summary()}
 
         data_to_keep["user"]["profile"] = profile_to_text(all_data=data_to_keep, profile_stats=profile_stats, fixed_last_date=self.fixed_last_date)
         return data_to_keep
@@ -0,0 +1,128 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import count
+
+# Responses with these status codes are retried
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+DEFAULT_TIMEOUT = (5, 30)
+DEFAULT_MAX_TRIES = 3
+DEFAULT_BACKOFF = 1
+DEFAULT_MAX_BACKOFF = 60
+DEFAULT_POOL_SIZE = 10
+
+
+class HostRateLimiter:
+    """
+    Allow at most <requests_per_second> requests per host, shared between threads.
+    A rate of 0 disables limiting.
+    """
+
+    def __init__(self, requests_per_second: float = 0):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def retry_after(response: requests.Response) -> float:
+    """
+    Seconds to wait based on the Retry-After header (seconds or http date), None if missing
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """
+    Shared http client for all Medium calls.
+    Keeps connections alive in a pool, retries connection errors and 429/5xx responses with exponential backoff
+    (honoring Retry-After) and keeps per endpoint counters (calls, attempts, errors and latency).
+    """
+
+    def __init__(self, timeout: tuple = DEFAULT_TIMEOUT, max_tries: int = DEFAULT_MAX_TRIES, backoff: float = DEFAULT_BACKOFF,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF, pool_size: int = DEFAULT_POOL_SIZE, requests_per_second: float = 0,
+                 session: requests.Session = None):
+        self.timeout = timeout
+        self.max_tries = max_tries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = HostRateLimiter(requests_per_second)
+        self.stats = {}
+        self.lock = threading.Lock()
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def record(self, endpoint: str, latency: float, error: bool = False, new_call: bool = False):
+        with self.lock:
+            stats = self.stats.setdefault(endpoint, {"calls": 0, "attempts": 0, "errors": 0, "latency": 0.0})
+            stats["calls"] += int(new_call)
+            stats["attempts"] += 1
+            stats["errors"] += int(error)
+            stats["latency"] += latency
+        count(f"http.{endpoint}.attempts")
+        count(f"http.{endpoint}.errors", int(error))
+
+    def get(self, url: str, endpoint: str = "other", headers: dict = None) -> requests.Response:
+        """
+        GET url, retrying on connection errors and retryable statuses. Raises for error statuses after the last try.
+        """
+        for attempt in range(1, self.max_tries + 1):
+            self.limiter.wait(url)
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.exceptions.RequestException:
+                self.record(endpoint, time.perf_counter() - start, error=True, new_call=attempt == 1)
+                if attempt == self.max_tries:
+                    raise
+                time.sleep(self.backoff_delay(attempt))
+                continue
+
+            retry = response.status_code in RETRY_STATUSES
+            self.record(endpoint, time.perf_counter() - start, error=retry, new_call=attempt == 1)
+            if retry and attempt < self.max_tries:
+                delay = retry_after(response)
+                time.sleep(min(delay, self.max_backoff) if delay is not None else self.backoff_delay(attempt))
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def backoff_delay(self, attempt: int) -> float:
+        return min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+
+    def print_stats(self):
+        for endpoint, stats in sorted(self.stats.items()):
+            avg_latency = stats["latency"] / stats["attempts"] * 1000
+            print(f"{endpoint}: {stats['calls']} calls, {stats['attempts']} attempts, {stats['errors']} errors, {avg_latency:.0f}ms avg latency")
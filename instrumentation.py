@@ -0,0 +1,115 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+# Stage timings {stage: {"calls", "seconds", "max_seconds"}} and counters {name: value} of the current process
+STAGES = {}
+COUNTERS = {}
+LOCK = threading.Lock()
+
+
+def record(stage: str, seconds: float):
+    with LOCK:
+        stats = STAGES.setdefault(stage, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+
+@contextmanager
+def timer(stage: str):
+    """
+    Time a block, e.g. with timer("render"): ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed(stage: str):
+    """
+    Time every call of a function, e.g. @timed("parse_markdown")
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, value: int = 1):
+    """
+    Add to a counter, e.g. count("analysis_cache.hits", 30)
+    """
+    with LOCK:
+        COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+
+def reset():
+    with LOCK:
+        STAGES.clear()
+        COUNTERS.clear()
+
+
+def report() -> dict:
+    """
+    Stage timings and counters of this process. Stages that run in worker processes (e.g. analysis with more than one
+    analysis worker) are only timed as a whole by the stage that started them.
+    """
+    with LOCK:
+        return {"created_at": datetime.now().isoformat(), "pid": os.getpid(),
+                "stages": {stage: dict(stats) for stage, stats in sorted(STAGES.items())}, "counters": dict(sorted(COUNTERS.items()))}
+
+
+def write_report(file_name: str, **extra) -> dict:
+    """
+    Write report() (and extra fields, e.g. run arguments) to a json file
+    """
+    rs = {**extra, **report()}
+    os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+    with open(file_name, 'w', encoding='utf8') as f:
+        json.dump(rs, f, indent=2, default=str)
+    return rs
+
+
+def print_report():
+    rs = report()
+    print(f"\n{'stage':<30}{'calls':>8}{'seconds':>10}{'max (ms)':>10}")
+    for stage, stats in rs["stages"].items():
+        print(f"{stage:<30}{stats['calls']:>8}{stats['seconds']:>10.2f}{stats['max_seconds'] * 1000:>10.1f}")
+    for name, value in rs["counters"].items():
+        print(f"{name}: {value}")
+
+
+@contextmanager
+def profiled(file_name: str = None, top: int = 25):
+    """
+    Run a block under cProfile, save the stats to <file_name> (if set, for snakeviz/pstats) and print the top functions
+    by cumulative time. Without <file_name> the block runs unprofiled.
+    """
+    if not file_name:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+        profiler.dump_stats(file_name)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+        print(out.getvalue())
@@ -1,37 +1,49 @@
-import validators
 from jinja2 import Template
-from urllib.parse import urlparse
 from get_data import MediumArticles
-import re
+from pipeline import DEFAULT_QUEUE_SIZE
 import argparse
+import json
 from dotenv import load_dotenv
 import os
-import validators
-from excluded_urls import EXCLUDE_URLS
 import openai
-
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from links import trim_url
+from disk_counter import close_articles
+from instrumentation import timed, profiled, print_report, write_report
+from text_analyzer import CHATGPT_WORKERS, CHATGPT_RPM, CHATGPT_TPM, DEFAULT_TAGGER, TAGGERS
 
 # load environment variables from .env file
 load_dotenv()
 
+openai.api_key = os.getenv("OPENAI_API_KEY")
+# Point to another (e.g. local) OpenAI compatible endpoint
+openai.api_base = os.getenv("OPENAI_API_BASE", openai.api_base)
+
 # Set default values
 DEFAULT_USERNAME = "justdataplease"
 DEFAULT_ARTICLES_LIMIT = 0
 DEFAULT_ISOLATE_ARTICLES = False
 USE_GPT = False
+DEFAULT_WORKERS = 1
+DEFAULT_REQUESTS_PER_SECOND = 0
+DEFAULT_ANALYSIS_WORKERS = 1
+DEFAULT_SYNC = False
+DEFAULT_STATS_TTL = 0
+DEFAULT_REFRESH_DAYS = 30
+DEFAULT_SPLIT_OUTPUT = False
+DEFAULT_STREAM = False
+DEFAULT_RESUME = False
+DEFAULT_BOUNDED_MEMORY = False
 FIXED_LAST_DATE = os.environ.get('FIXED_LAST_DATE', default=None)
+TEMPLATE_FILE = 'templates/template.html'
 
+# Node fields shown in the info panel, written to the details file with split output (see write_graph_files())
+DETAIL_FIELDS = ["stats", "urls"]
 
-def trim_url(url: str) -> str:
-    try:
-        url = url.split("?")[0].split("#")[0]
-        if url[-1] == '/':
-            url = url[0:-1]
-        url_last = url.split("/")[-1]
-    except Exception:
-        return
-    return url_last
+# Article colors per author in merged graphs (see build_merged_graph())
+AUTHOR_COLORS = ["#fdfd96", "#ffb347", "#77dd77", "#aec6cf", "#f49ac2", "#cb99c9", "#ff6961", "#84b6f4", "#fdcae1", "#b39eb5"]
+
+# Compiled templates (see load_template())
+TEMPLATES = {}
 
 
 def rescale(numbers: list, scale: tuple = (30, 70)) -> dict:
@@ -39,6 +51,10 @@ def rescale(numbers: list, scale: tuple = (30, 70)) -> dict:
     max_value = max(numbers)
     new_min, new_max = scale
 
+    # All numbers are the same (e.g. a single article), use the middle of the scale
+    if max_value == min_value:
+        return {number: (new_min + new_max) / 2 for number in numbers}
+
     scaled_numbers = {}
     for number in numbers:
         scaled_number = ((number - min_value) / (max_value - min_value)) * (new_max - new_min) + new_min
@@ -47,11 +63,47 @@ def rescale(numbers: list, scale: tuple = (30, 70)) -> dict:
     return scaled_numbers
 
 
+@timed("get_profile")
+def get_profile(user: str, articles_limit: int = 10, reset: bool = False, fixed_last_date: str = None,
+                use_gpt: bool = False, workers: int = DEFAULT_WORKERS, requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+                analysis_workers: int = DEFAULT_ANALYSIS_WORKERS, sync: bool = DEFAULT_SYNC, stats_ttl: float = DEFAULT_STATS_TTL,
+                refresh_days: int = DEFAULT_REFRESH_DAYS, gpt_workers: int = CHATGPT_WORKERS, gpt_rpm: int = CHATGPT_RPM,
+                gpt_tpm: int = CHATGPT_TPM, tagger: str = DEFAULT_TAGGER, stream: bool = DEFAULT_STREAM, queue_size: int = DEFAULT_QUEUE_SIZE,
+                resume: bool = DEFAULT_RESUME, bounded_memory: bool = DEFAULT_BOUNDED_MEMORY, since: str = None, until: str = None) -> dict:
+    """
+    Analyzed articles of a user (see MediumArticles.get_all_articles())
+    """
+    a = MediumArticles(username=user, articles_limit=articles_limit, reset=reset, fixed_last_date=fixed_last_date, use_gpt=use_gpt, workers=workers,
+                       requests_per_second=requests_per_second, analysis_workers=analysis_workers, sync=sync, stats_ttl=stats_ttl,
+                       refresh_days=refresh_days, gpt_workers=gpt_workers, gpt_rpm=gpt_rpm, gpt_tpm=gpt_tpm, tagger=tagger,
+                       stream=stream, queue_size=queue_size, resume=resume,
+                       bounded_memory=bounded_memory, since=since, until=until)
+    return a.get_all_articles()
+
+
 def get_links(user: str, isolate_articles: bool = True, articles_limit: int = 10, reset: bool = False, fixed_last_date: str = None,
-              use_gpt: bool = False) -> dict:
-    a = MediumArticles(username=user, articles_limit=articles_limit, reset=reset, fixed_last_date=fixed_last_date, use_gpt=use_gpt)
-    articles_dict = a.get_all_articles()
+              use_gpt: bool = False, workers: int = DEFAULT_WORKERS, requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+              analysis_workers: int = DEFAULT_ANALYSIS_WORKERS, sync: bool = DEFAULT_SYNC, stats_ttl: float = DEFAULT_STATS_TTL,
+              refresh_days: int = DEFAULT_REFRESH_DAYS, gpt_workers: int = CHATGPT_WORKERS, gpt_rpm: int = CHATGPT_RPM,
+              gpt_tpm: int = CHATGPT_TPM, tagger: str = DEFAULT_TAGGER, stream: bool = DEFAULT_STREAM, queue_size: int = DEFAULT_QUEUE_SIZE,
+              resume: bool = DEFAULT_RESUME, bounded_memory: bool = DEFAULT_BOUNDED_MEMORY, since: str = None, until: str = None) -> dict:
+    articles_dict = get_profile(user, articles_limit=articles_limit, reset=reset, fixed_last_date=fixed_last_date, use_gpt=use_gpt, workers=workers,
+                                requests_per_second=requests_per_second, analysis_workers=analysis_workers, sync=sync, stats_ttl=stats_ttl,
+                                refresh_days=refresh_days, gpt_workers=gpt_workers, gpt_rpm=gpt_rpm, gpt_tpm=gpt_tpm, tagger=tagger,
+                                stream=stream, queue_size=queue_size, resume=resume,
+                                bounded_memory=bounded_memory, since=since, until=until)
+    try:
+        return build_graph(articles_dict, isolate_articles=isolate_articles)
+    finally:
+        close_articles(articles_dict)
 
+
+@timed("build_graph")
+def build_graph(articles_dict: dict, isolate_articles: bool = True) -> dict:
+    """
+    Create graph nodes (articles and external website domains) and edges from analyzed articles (with normalized_links, see links.normalize_links())
+    Articles are iterated twice and not modified, so they can be read back from disk (see disk_counter.DiskArticles).
+    """
     articles = articles_dict["articles"]
     user = articles_dict["user"]
 
@@ -76,38 +128,39 @@ def get_links(user: str, isolate_articles: bool = True, articles_limit: int = 10
               "description": stats_dict['h2'], "urls": [], "main": 1, "counter": 1, "font": {"color": "#000000", "size": 20}}
         article_index[trimmed_url] = main_counter
         dataset[main_counter] = ar
-        article["counter"] = main_counter
 
     connections = []
+    # Index of connections in both directions, to avoid recreating a connection
+    connection_index = set()
+    # Urls of external website domain nodes, copied to nodes at the end
+    urls_index = {}
     # Ids of external website domain nodes will start from 100000 (articles ids start from 1)
     counter = 100000
     already_found_index = {}
 
-    # Create nodes for external website domains and connections between them and the articles
-    for article in articles:
+    # Create nodes for external website domains and connections between them and the articles (in the same order as the article nodes)
+    for article_id, article in enumerate(articles, start=1):
         already_found_in_article_index = {}
 
         if isolate_articles:
             already_found_index = {}
 
         stats_text = article['stats']
-        article_id = article['counter']
 
         dataset[article_id]["stats"] = stats_text
 
-        for link in article['links']:
-            text = link[0]
-            href = link[1]
+        for link in article['normalized_links']:
+            text = link.text
+            href = link.href
 
-            trimmed_href = trim_url(href)
-            domain = urlparse(href).netloc
+            domain = link.domain
             description_url = (text or "") + "|" + (href or "")
 
             if href:
                 # Check if it is a valid url else do not bother
-                if validators.url(href) and not re.search(EXCLUDE_URLS, href):
+                if link.valid and not link.excluded:
 
-                    found_main_article = article_index.get(trimmed_href)
+                    found_main_article = article_index.get(link.slug)
                     # If this is an external website domain (dot)
                     if not found_main_article:
                         if already_found_index.get(domain):
@@ -118,7 +171,7 @@ def get_links(user: str, isolate_articles: bool = True, articles_limit: int = 10
                                 if dataset[id]["size"] <= 50:
                                     dataset[id]["size"] += 2
 
-                            dataset[id]["urls"] = list(set(dataset[id]["urls"] + [description_url]))
+                            urls_index[id].add(description_url)
                             dataset[id]["label"] = dataset[id]["label"].split("|")[0] + "|" + str(dataset[id]["counter"])
 
                             if isolate_articles:
@@ -128,7 +181,8 @@ def get_links(user: str, isolate_articles: bool = True, articles_limit: int = 10
                             id = counter
                             dataset[id] = {"id": id, "shape": "dot", "url": domain, "domain": domain, "size": 10, "label": domain.replace("www.", ""),
                                            "description": text,
-                                           "main": 0, "urls": [description_url], "counter": 1}
+                                           "main": 0, "urls": [], "counter": 1}
+                            urls_index[id] = {description_url}
 
                         already_found_index[domain] = id
                         already_found_in_article_index[domain] = id
@@ -142,34 +196,170 @@ def get_links(user: str, isolate_articles: bool = True, articles_limit: int = 10
                                        "color": {"color": connections_color, "highlight": highlight_color}}
                     connection_edge_tuple = (id, article_id)
 
-                    # All connections
-                    connection_tuples = [(x["from"], x["to"]) for x in connections] + [(x["to"], x["from"]) for x in connections]
-
                     # If there is already a connection do not recreate
-                    if (connection_edge_tuple not in connection_tuples) and (article_id != id):
+                    if (connection_edge_tuple not in connection_index) and (article_id != id):
                         connections.append(connection_edge)
+                        connection_index.add(connection_edge_tuple)
+                        connection_index.add((article_id, id))
+
+    for id, urls in urls_index.items():
+        dataset[id]["urls"] = list(urls)
 
     return {"nodes": list(dataset.values()), "edges": connections,
             "user_profile": user["profile"],
             "user_image": user["info"]["image_url"]}
 
 
-def render_html(username=DEFAULT_USERNAME, isolate_articles=DEFAULT_ARTICLES_LIMIT, articles_limit=DEFAULT_ARTICLES_LIMIT, fixed_last_date=FIXED_LAST_DATE,
-                use_gpt=USE_GPT):
-    dataset = get_links(username, isolate_articles=isolate_articles, articles_limit=articles_limit, fixed_last_date=fixed_last_date, use_gpt=use_gpt)
+@timed("build_merged_graph")
+def build_merged_graph(profiles: dict) -> dict:
+    """
+    Merge analyzed profiles ({username: get_profile()}) into one mixed graph.
+    Node ids are stable across runs and authors ("article:<article id>", "domain:<domain>"), so an external website domain
+    referenced by many authors and an article linked by another author are single shared nodes.
+    """
+    articles = {}
+    authors = {}
+    for username, articles_dict in profiles.items():
+        for article in articles_dict["articles"]:
+            # The same article can be in more than one profile (e.g. author and publication), keep the first
+            if article["id"] not in articles:
+                articles[article["id"]] = article
+                authors[article["id"]] = username
+
+    voter_count_rescaled_index = rescale([article["voter_count"] for article in articles.values()])
+    author_colors = {username: AUTHOR_COLORS[i % len(AUTHOR_COLORS)] for i, username in enumerate(profiles)}
 
-    # Process template and generate html
-    with open('templates/template.html') as file:
-        template = Template(file.read())
+    dataset = {}
+    article_index = {}
+    # Create nodes for articles
+    for article_id, article in articles.items():
+        id = f"article:{article_id}"
+        stats_dict = article['stats_dict']
+        dataset[id] = {"id": id, "shape": "star", "color": author_colors[authors[article_id]], "label": stats_dict['h1'][0:20],
+                       "main_title": stats_dict['h1'], "size": voter_count_rescaled_index[article["voter_count"]], "url": article["url"],
+                       "domain": article["url"], "description": stats_dict['h2'], "author": authors[article_id], "stats": article["stats"],
+                       "urls": [], "main": 1, "counter": 1, "font": {"color": "#000000", "size": 20}}
+        article_index[trim_url(article["url"])] = id
 
-    output_file_name = f'output/{username.replace(".", "_")}_{"i" if isolate_articles else "m"}.html'
+    connections = []
+    # Index of connections in both directions, to avoid recreating a connection
+    connection_index = set()
+    urls_index = {}
+
+    # Create nodes for external website domains and connections between them and the articles
+    for article_id, article in articles.items():
+        article_node_id = f"article:{article_id}"
+        domains_in_article = set()
+
+        for link in article['normalized_links']:
+            if not (link.href and link.valid and not link.excluded):
+                continue
+
+            found_main_article = article_index.get(link.slug)
+            if found_main_article:
+                id = found_main_article
+            else:
+                id = f"domain:{link.domain}"
+                if id not in dataset:
+                    dataset[id] = {"id": id, "shape": "dot", "url": link.domain, "domain": link.domain, "size": 10,
+                                   "label": link.domain.replace("www.", ""), "description": link.text, "main": 0, "urls": [], "counter": 0}
+                    urls_index[id] = set()
+                # Domain size and counter grow once per referencing article
+                if link.domain not in domains_in_article:
+                    domains_in_article.add(link.domain)
+                    dataset[id]["counter"] += 1
+                    if dataset[id]["counter"] > 1 and dataset[id]["size"] <= 50:
+                        dataset[id]["size"] += 2
+                    dataset[id]["label"] = dataset[id]["label"].split("|")[0] + (f"|{dataset[id]['counter']}" if dataset[id]["counter"] > 1 else "")
+                urls_index[id].add((link.text or "") + "|" + link.href)
+
+            if (id, article_node_id) not in connection_index and id != article_node_id:
+                connections_color = '#A7C7E7' if found_main_article else '#dbd7d7'
+                highlight_color = '#3c82ca' if found_main_article else '#9a8f8f'
+                connections.append({"from": id, "to": article_node_id, "font": {"color": "#808080", "size": 10},
+                                    "color": {"color": connections_color, "highlight": highlight_color}})
+                connection_index.add((id, article_node_id))
+                connection_index.add((article_node_id, id))
+
+    for id, urls in urls_index.items():
+        dataset[id]["urls"] = list(urls)
+
+    authors_profile = "".join(f"<b style='color: {author_colors[username]}'>&#9733;</b> <a href='https://medium.com/@{username}'>{username}</a>"
+                              f" ({len(articles_dict['articles'])} articles)<br>" for username, articles_dict in profiles.items())
+    return {"nodes": list(dataset.values()), "edges": connections, "user_profile": authors_profile, "user_image": ""}
+
+
+def load_template(file_name: str = TEMPLATE_FILE) -> Template:
+    """
+    Load and compile the jinja template once per process
+    """
+    if file_name not in TEMPLATES:
+        with open(file_name) as file:
+            TEMPLATES[file_name] = Template(file.read())
+    return TEMPLATES[file_name]
+
+
+def write_ndjson(rows, file_name: str):
+    """
+    Write rows as compact json lines, one row at a time
+    """
+    with open(file_name, 'w', encoding='utf8') as file:
+        for row in rows:
+            file.write(json.dumps(row, separators=(',', ':')) + "\n")
+
+
+def write_graph_files(dataset: dict, base_file_name: str) -> tuple:
+    """
+    Write nodes (without details) and edges to <base_file_name>.graph.ndjson and node details to <base_file_name>.details.ndjson,
+    so that the HTML only loads the graph and node details are loaded on the first click
+    """
+    graph_file_name = f'{base_file_name}.graph.ndjson'
+    details_file_name = f'{base_file_name}.details.ndjson'
+
+    nodes = ({"node": {key: value for key, value in node.items() if key not in DETAIL_FIELDS}} for node in dataset["nodes"])
+    edges = ({"edge": edge} for edge in dataset["edges"])
+    write_ndjson((row for rows in [nodes, edges] for row in rows), graph_file_name)
+    write_ndjson(({"id": node["id"], **{key: node.get(key, "") for key in DETAIL_FIELDS}} for node in dataset["nodes"]), details_file_name)
+    return graph_file_name, details_file_name
+
+
+def render_html(username=DEFAULT_USERNAME, isolate_articles=DEFAULT_ARTICLES_LIMIT, articles_limit=DEFAULT_ARTICLES_LIMIT, fixed_last_date=FIXED_LAST_DATE,
+                use_gpt=USE_GPT, workers=DEFAULT_WORKERS, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, analysis_workers=DEFAULT_ANALYSIS_WORKERS,
+                sync=DEFAULT_SYNC, stats_ttl=DEFAULT_STATS_TTL, refresh_days=DEFAULT_REFRESH_DAYS, gpt_workers=CHATGPT_WORKERS, gpt_rpm=CHATGPT_RPM,
+                gpt_tpm=CHATGPT_TPM, tagger=DEFAULT_TAGGER, split_output=DEFAULT_SPLIT_OUTPUT, stream=DEFAULT_STREAM, queue_size=DEFAULT_QUEUE_SIZE,
+                resume=DEFAULT_RESUME, bounded_memory=DEFAULT_BOUNDED_MEMORY, since=None, until=None):
+    """
+    Render the graph of a user to output/<username>_<m|i>.html (see write_html())
+    """
+    dataset = get_links(username, isolate_articles=isolate_articles, articles_limit=articles_limit, fixed_last_date=fixed_last_date, use_gpt=use_gpt,
+                        workers=workers, requests_per_second=requests_per_second, analysis_workers=analysis_workers, sync=sync, stats_ttl=stats_ttl,
+                        refresh_days=refresh_days, gpt_workers=gpt_workers, gpt_rpm=gpt_rpm, gpt_tpm=gpt_tpm, tagger=tagger,
+                        stream=stream, queue_size=queue_size, resume=resume,
+                        bounded_memory=bounded_memory, since=since, until=until)
+
+    base_file_name = f'output/{username.replace(".", "_")}_{"i" if isolate_articles else "m"}'
+    return write_html(dataset, base_file_name, user=username, isolate_articles=isolate_articles, split_output=split_output)
+
+
+@timed("write_html")
+def write_html(dataset: dict, base_file_name: str, user: str, isolate_articles: bool = False, split_output: bool = DEFAULT_SPLIT_OUTPUT) -> str:
+    """
+    Render a graph (see build_graph()) to <base_file_name>.html.
+    With <split_output> the graph is written to separate ndjson files (see write_graph_files()) and the HTML is only the page shell.
+    """
+    template = load_template()
+    output_file_name = f'{base_file_name}.html'
+
+    graph_file_name, details_file_name = write_graph_files(dataset, base_file_name) if split_output else (None, None)
 
     with open(output_file_name, 'w', encoding='utf8') as file:
-        file.write(
-            template.render(data=dataset, user=username,
-                            user_image=dataset["user_image"],
-                            user_profile=dataset["user_profile"],
-                            isolate_articles=isolate_articles))
+        template.stream(data=None if split_output else dataset, user=user,
+                        user_image=dataset["user_image"],
+                        user_profile=dataset["user_profile"],
+                        isolate_articles=isolate_articles,
+                        graph_file=graph_file_name and os.path.basename(graph_file_name),
+                        details_file=details_file_name and os.path.basename(details_file_name)).dump(file)
+    return output_file_name
 
 
 if __name__ == "__main__":
@@ -180,6 +370,43 @@ if __name__ == "__main__":
     parser.add_argument("-i", "--isolate", action="store_true", default=DEFAULT_ISOLATE_ARTICLES, help="whether to isolate articles")
     parser.add_argument("-fd", "--fdate", type=str, default=FIXED_LAST_DATE, help="fixed last date to calculate last seen")
     parser.add_argument("-ai", "--ai", action="store_true", default=USE_GPT, help="use chatgpt to extract keywords and summary")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="number of threads used to download articles")
+    parser.add_argument("-rps", "--rps", type=float, default=DEFAULT_REQUESTS_PER_SECOND, help="maximum requests per second per host (0 for no limit)")
+    parser.add_argument("-aw", "--analysis-workers", type=int, default=DEFAULT_ANALYSIS_WORKERS, help="number of processes used to analyze articles")
+    parser.add_argument("-s", "--sync", action="store_true", default=DEFAULT_SYNC, help="download only new articles (per article cache)")
+    parser.add_argument("-ttl", "--stats-ttl", type=float, default=DEFAULT_STATS_TTL,
+                        help="with --sync, refresh stats of recent articles older than this many hours (0 to never refresh)")
+    parser.add_argument("-rd", "--refresh-days", type=int, default=DEFAULT_REFRESH_DAYS, help="with --stats-ttl, articles published in the last days are refreshed")
+    parser.add_argument("-gw", "--gpt-workers", type=int, default=CHATGPT_WORKERS, help="number of threads used for chatgpt requests")
+    parser.add_argument("-rpm", "--rpm", type=int, default=CHATGPT_RPM, help="maximum chatgpt requests per minute (0 for no limit)")
+    parser.add_argument("-tpm", "--tpm", type=int, default=CHATGPT_TPM, help="maximum chatgpt tokens per minute (0 for no limit)")
+    parser.add_argument("-t", "--tagger", choices=TAGGERS.keys(), default=DEFAULT_TAGGER, help="part-of-speech tagger (lexicon is faster, less accurate)")
+    parser.add_argument("-so", "--split-output", action="store_true", default=DEFAULT_SPLIT_OUTPUT,
+                        help="write the graph to separate ndjson files loaded by the HTML (for large profiles, needs an http server)")
+    parser.add_argument("-st", "--stream", action="store_true", default=DEFAULT_STREAM,
+                        help="download, analyze and enrich articles as overlapping stages (an article that fails does not stop the others)")
+    parser.add_argument("-qs", "--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="with --stream, articles queued between two stages")
+    parser.add_argument("-rs", "--resume", action="store_true", default=DEFAULT_RESUME,
+                        help="resume an interrupted download with the stored article list (without listing the user's articles again)")
+    parser.add_argument("-bm", "--bounded-memory", action="store_true", default=DEFAULT_BOUNDED_MEMORY,
+                        help="for profiles with thousands of articles, stream articles and keep profile word counts on disk (implies --stream)")
+    parser.add_argument("-sd", "--since", type=str, default=None, help="only analyze articles published on or after this date (YYYY-MM-DD)")
+    parser.add_argument("-ud", "--until", type=str, default=None, help="only analyze articles published on or before this date (YYYY-MM-DD)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print stage timings and counters after the run")
+    parser.add_argument("-rp", "--report", type=str, default=None, help="write stage timings and counters to this json file")
+    parser.add_argument("-pf", "--profile", type=str, default=None, help="run under cProfile and save the stats to this file")
     args = parser.parse_args()
 
-    render_html(username=args.username, isolate_articles=args.isolate, articles_limit=args.limit, fixed_last_date=args.fdate, use_gpt=args.ai)
+    with profiled(args.profile):
+        render_html(username=args.username, isolate_articles=args.isolate, articles_limit=args.limit, fixed_last_date=args.fdate,
+                    use_gpt=args.ai,
+                    workers=args.workers, requests_per_second=args.rps, analysis_workers=args.analysis_workers,
+                    sync=args.sync, stats_ttl=args.stats_ttl, refresh_days=args.refresh_days,
+                    gpt_workers=args.gpt_workers, gpt_rpm=args.rpm, gpt_tpm=args.tpm, tagger=args.tagger, split_output=args.split_output,
+                    stream=args.stream, queue_size=args.queue_size, resume=args.resume,
+                    bounded_memory=args.bounded_memory, since=args.since, until=args.until)
+
+    if args.verbose:
+        print_report()
+    if args.report:
+        write_report(args.report, args=vars(args))
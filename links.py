@@ -0,0 +1,58 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+import validators
+
+from excluded_urls import EXCLUDE_URLS
+
+EXCLUDE_URLS_RE = re.compile(EXCLUDE_URLS)
+# Profile stats do not count links to Medium as external domains
+EXCLUDE_PROFILE_URLS_RE = re.compile(EXCLUDE_URLS + "|medium")
+
+
+class Link(NamedTuple):
+    text: str
+    href: str
+    domain: str
+    slug: str
+    valid: bool
+    excluded: bool
+    excluded_from_profile: bool
+
+
+def trim_url(url: str) -> str:
+    """
+    Last part of the url path (without query, fragment and trailing slash), used to match links to articles
+    """
+    try:
+        url = url.split("?")[0].split("#")[0]
+        if url[-1] == '/':
+            url = url[0:-1]
+        url_last = url.split("/")[-1]
+    except Exception:
+        return
+    return url_last
+
+
+@lru_cache(maxsize=2 ** 16)
+def normalize_href(href: str) -> tuple:
+    """
+    Returns (domain, slug, valid, excluded, excluded_from_profile) of a url, memoized because the same urls appear in many articles
+    """
+    if not href:
+        return "", None, False, False, False
+    return (urlparse(href).netloc, trim_url(href), bool(validators.url(href)),
+            bool(EXCLUDE_URLS_RE.search(href)), bool(EXCLUDE_PROFILE_URLS_RE.search(href)))
+
+
+def is_valid_url(href: str) -> bool:
+    return normalize_href(href)[2]
+
+
+def normalize_links(links: list) -> list:
+    """
+    Normalize (text, href) links once, so that graph building and profile stats only read the Link fields
+    """
+    return [Link(text, href, *normalize_href(href)) for text, href in links]
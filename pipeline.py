@@ -0,0 +1,124 @@
+import queue
+import threading
+
+from instrumentation import count
+
+DEFAULT_QUEUE_SIZE = 8
+
+# Marks the end of the items of a queue (one per thread reading the queue)
+DONE = object()
+
+
+class Stage:
+    """
+    A pipeline stage: func is called with the result of the previous stage (or an item) by <workers> threads
+    """
+
+    def __init__(self, name: str, func, workers: int = 1):
+        self.name = name
+        self.func = func
+        self.workers = max(workers, 1)
+
+
+def run_pipeline(items, stages: list, queue_size: int = DEFAULT_QUEUE_SIZE, ordered: bool = False):
+    """
+    Run items through stages that overlap: every stage has its own threads and stages are connected by queues of
+    <queue_size> items, so a slow stage makes the previous stages wait and at most about <queue_size> items (plus the items
+    being processed) are held between two stages.
+    Yields (index of the item, result of the last stage) as items leave the pipeline, or in item order if <ordered> (items are
+    then fed only while the items waiting for an earlier one fit in the queues, so memory stays bounded). If a stage fails
+    for an item, the exception is yielded as its result and the next stages skip the item, except KeyboardInterrupt and
+    SystemExit that are raised. A stage that returns None drops the item, None is yielded as its result. Closing the
+    generator early (or an exception) stops all stages, items being processed are finished.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    # Threads reading each queue, the output queue is read by the caller
+    readers = [stage.workers for stage in stages] + [1]
+    stop = threading.Event()
+    # Items fed and not yet yielded in order
+    in_flight = threading.Semaphore(queue_size * len(queues) + sum(stage.workers for stage in stages)) if ordered else None
+
+    def put(q: queue.Queue, item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q: queue.Queue):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return DONE
+
+    def acquire() -> bool:
+        while not stop.is_set():
+            if in_flight.acquire(timeout=0.1):
+                return True
+        return False
+
+    def feed():
+        for item in enumerate(items):
+            if in_flight and not acquire():
+                return
+            if not put(queues[0], item):
+                return
+        for _ in range(readers[0]):
+            put(queues[0], DONE)
+
+    def work(k: int, stage: Stage, finished: list, lock: threading.Lock):
+        while True:
+            item = get(queues[k])
+            if item is DONE:
+                break
+            index, value = item
+            if value is not None and not isinstance(value, BaseException):
+                try:
+                    value = stage.func(value)
+                except BaseException as exc:
+                    count(f"pipeline.{stage.name}.errors")
+                    value = exc
+            if not put(queues[k + 1], (index, value)):
+                return
+        # The last thread of a stage to finish ends the input of the next stage
+        with lock:
+            finished[0] += 1
+            is_last = finished[0] == stage.workers
+        if is_last:
+            for _ in range(readers[k + 1]):
+                put(queues[k + 1], DONE)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    for k, stage in enumerate(stages):
+        finished = [0]
+        lock = threading.Lock()
+        threads.extend(threading.Thread(target=work, args=(k, stage, finished, lock), name=f"{stage.name}-{i}", daemon=True)
+                       for i in range(stage.workers))
+    for thread in threads:
+        thread.start()
+
+    pending = {}
+    next_index = 0
+    try:
+        while True:
+            item = get(queues[-1])
+            if item is DONE:
+                break
+            if isinstance(item[1], BaseException) and not isinstance(item[1], Exception):
+                raise item[1]
+            if not ordered:
+                yield item
+                continue
+            pending[item[0]] = item[1]
+            while next_index in pending:
+                in_flight.release()
+                yield next_index, pending.pop(next_index)
+                next_index += 1
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,83 @@
+import csv
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+DEFAULT_CACHE_FILE = 'data/openai_responses.sqlite'
+
+
+def prompt_hash(model: str, prompt: str) -> str:
+    """
+    Responses are keyed by article id and a hash of the model and prompt template, so changing either invalidates them
+    """
+    return hashlib.sha256(f"{model}\n{prompt}".encode('utf8')).hexdigest()[0:16]
+
+
+class ResponseCache:
+    """
+    ChatGPT responses stored in SQLite, keyed by (article_id, prompt_hash).
+    Responses of <prompt_hash> are loaded once in memory and new responses are appended on write.
+    It is safe to use from many threads and many processes (sqlite WAL mode).
+    """
+
+    def __init__(self, key: str, file_name: str = DEFAULT_CACHE_FILE):
+        self.key = key
+        self.file_name = file_name
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(file_name, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                   article_id TEXT NOT NULL,
+                                   prompt_hash TEXT NOT NULL,
+                                   response TEXT NOT NULL,
+                                   created_at TEXT NOT NULL,
+                                   PRIMARY KEY (article_id, prompt_hash))""")
+        self.connection.commit()
+
+        rows = self.connection.execute("SELECT article_id, response FROM responses WHERE prompt_hash = ?", (key,))
+        self.responses = dict(rows)
+
+    def get(self, article_id: str) -> str:
+        return self.responses.get(article_id)
+
+    def put(self, article_id: str, response: str):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                                    (article_id, self.key, response, datetime.now().isoformat()))
+            self.connection.commit()
+            self.responses[article_id] = response
+
+    def import_csv(self, file_name: str) -> int:
+        """
+        Import responses from a <username>_openai_responses.csv file (tab delimited article_id, response).
+        Responses that already exist are kept.
+        """
+        with open(file_name, 'r', newline='', encoding='utf8') as f:
+            rows = [(cols[0], cols[1]) for cols in csv.reader(f, delimiter='\t') if len(cols) >= 2 and cols[0] not in self.responses]
+
+        with self.lock:
+            created_at = datetime.fromtimestamp(os.path.getmtime(file_name)).isoformat()
+            self.connection.executemany("INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?)",
+                                        [(article_id, self.key, response, created_at) for article_id, response in rows])
+            self.connection.commit()
+            for article_id, response in rows:
+                self.responses.setdefault(article_id, response)
+        return len(rows)
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    # Import existing csv files, e.g. python response_cache.py data/*_openai_responses.csv
+    from text_analyzer import CHATGPT_MODEL, CHATGPT_PROMPT
+
+    cache = ResponseCache(prompt_hash(CHATGPT_MODEL, CHATGPT_PROMPT))
+    for csv_file_name in sys.argv[1:]:
+        print(f"imported {cache.import_csv(csv_file_name)} responses from {csv_file_name}...")
+    cache.close()
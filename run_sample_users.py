@@ -1,9 +1,9 @@
-from kgraph import render_html
+from batch import run_batch, print_summary
 
 usernames = ['justdataplease', 'umairh', 'frank-andrade', 'nikoskafritsas', 'dima806', 'anne.bonfert', 'coachtony',
              'benjaminsledge', 'kozyrkov', 'dariusforoux', 'barackobama', 'dagster-io', 'MediumStaff', 'towardsdatascience',
              'mccallisaiah']
 
-for username in usernames:
-    render_html(username=username, articles_limit=30, use_gpt=True, fixed_last_date='2023-04-05', isolate_articles=True)
-    print(f"finished with {username}")
+if __name__ == "__main__":
+    results = run_batch(usernames, articles_limit=30, use_gpt=True, fixed_last_date='2023-04-05', isolate_articles=True)
+    print_summary(results)
@@ -1,17 +1,47 @@
 import re
 from collections import Counter
 import datetime
-from urllib.parse import urlparse
-from excluded_urls import EXCLUDE_URLS
 
 from nltk import PorterStemmer
 from nltk.corpus import stopwords
-from nltk.tag import pos_tag
+from nltk.tag import PerceptronTagger
 from nltk.util import ngrams
-import validators
 import os
-import csv
 import openai
+import markdown
+import bs4
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+import threading
+import time
+from functools import lru_cache, partial
+from itertools import islice
+from operator import itemgetter
+import heapq
+from response_cache import ResponseCache, prompt_hash
+from instrumentation import timed, count
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CHATGPT_MODEL = "gpt-3.5-turbo"
+CHATGPT_KEYPHRASES = 10
+CHATGPT_CONTEXT_TOKENS = 4096
+CHATGPT_REPLY_TOKENS = 500
+CHATGPT_RPM = 3500
+CHATGPT_TPM = 90000
+CHATGPT_WORKERS = 4
+CHATGPT_MAX_TRIES = 5
+CHATGPT_PROMPT = "Please provide a summary and suggest the top {num_keyphrases} keywords that best describe the important topics or themes present in the following text. Your answer should include the format: KEYWORDS=keyword_1, keyword_2, ..., keyword_{num_keyphrases} and SUMMARY=summary_text.\n\n {full_text}"
+
+# NLTK resources are loaded once per process (see load_resources())
+TAGGER = None
+STOP_WORDS = None
+STEMMER = PorterStemmer()
+# Tags of words that are not in the tagger's dictionary (see lexicon_tags())
+LEXICON = {}
 
 
 def tag_visible(element) -> bool:
@@ -25,16 +55,90 @@ def get_ngrams(words: list, n: int) -> list:
     return [' '.join(grams) for grams in n_grams]
 
 
-def pos_tagger(words: list) -> dict:
+def get_tagger() -> PerceptronTagger:
+    """
+    Load NLTK's perceptron tagger once per process (nltk.pos_tag reloads the model on every call)
+    """
+    global TAGGER
+    if TAGGER is None:
+        TAGGER = PerceptronTagger()
+    return TAGGER
+
+
+def get_stop_words() -> frozenset:
+    """
+    Load english stopwords once per process
+    """
+    global STOP_WORDS
+    if STOP_WORDS is None:
+        STOP_WORDS = frozenset(stopwords.words('english'))
+    return STOP_WORDS
+
+
+def load_resources():
+    """
+    Load NLTK resources, used to initialize analysis worker processes
+    """
+    get_tagger()
+    get_stop_words()
+
+
+def perceptron_tags(words: list) -> list:
+    """
+    Tag words with NLTK's perceptron tagger (uses the previous tags and the surrounding words)
+    """
+    return [tag for word, tag in get_tagger().tag(words)]
+
+
+def predict_word_tag(word: str) -> str:
+    """
+    Tag a single word with the perceptron model, without context
+    """
+    tagger = get_tagger()
+    context = tagger.START + [tagger.normalize(word)] + tagger.END
+    tag, conf = tagger.model.predict(tagger._get_features(0, word, context, *tagger.START))
+    return tag
+
+
+def lexicon_tags(words: list) -> list:
+    """
+    Faster, less accurate tagging. Words are looked up in the perceptron tagger's dictionary of frequent unambiguous words,
+    unknown words are tagged once by the perceptron model without context and memoized (per process).
+    """
+    tagdict = get_tagger().tagdict
+    tags = []
+    for word in words:
+        tag = tagdict.get(word) or LEXICON.get(word)
+        if tag is None:
+            tag = LEXICON[word] = predict_word_tag(word)
+        tags.append(tag)
+    return tags
+
+
+# Tagger backends, selected by name
+TAGGERS = {
+    "perceptron": perceptron_tags,
+    "lexicon": lexicon_tags,
+}
+DEFAULT_TAGGER = "perceptron"
+
+# Part-of-speech tags counted per category
+POS_CATEGORIES = {
+    **{tag: "adj" for tag in ['JJ', 'JJR', 'JJS']},
+    **{tag: "noun" for tag in ['NN', 'NNS', 'NNP', 'NNPS']},
+    **{tag: "verb" for tag in ['VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ']},
+}
+
+
+@timed("pos_tagger")
+def pos_tagger(words: list, tagger: str = DEFAULT_TAGGER) -> dict:
     # Part-of-speech tag each token
-    pos_tags = pos_tag(words)
+    pos_tags = TAGGERS[tagger](words)
 
-    # Count the number of adjectives, nouns, and verbs
-    num_adjectives = len([word for word, pos in pos_tags if pos in ['JJ', 'JJR', 'JJS']])
-    num_nouns = len([word for word, pos in pos_tags if pos in ['NN', 'NNS', 'NNP', 'NNPS']])
-    num_verbs = len([word for word, pos in pos_tags if pos in ['VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ']])
+    # Count the number of adjectives, nouns, and verbs in one pass
+    pos_counts = Counter(map(POS_CATEGORIES.get, pos_tags))
 
-    return {"adj": num_adjectives, "noun": num_nouns, "verb": num_verbs}
+    return {"adj": pos_counts["adj"], "noun": pos_counts["noun"], "verb": pos_counts["verb"]}
 
 
 def get_day_of_week(date):
@@ -42,38 +146,57 @@ def get_day_of_week(date):
     return day_of_week
 
 
-def text_stemmer(words: list) -> dict:
-    stemmer = PorterStemmer()
+@lru_cache(maxsize=None)
+def stem(word: str) -> str:
+    """
+    Porter stem of a word, memoized for all articles and profiles of a process
+    """
+    return STEMMER.stem(word)
 
-    # Use the PorterStemmer to stem each word, excluding stopwords
-    stop_words = set(stopwords.words('english'))
 
-    # Map a stem word with a normal word (randomly)
-    stemmed_normal_index = {stemmer.stem(word): word for word in words if word not in stop_words}
+def text_stemmer(words: list) -> list:
+    stop_words = get_stop_words()
 
-    # Exclude english stop words and words with length <=2
-    stemmed_words = [stemmed_normal_index[stemmer.stem(word)] for word in words if word not in stop_words and len(word) > 2]
-    return stemmed_words
+    # Stem each word once (excluding stopwords) and map a stem word with a normal word (randomly)
+    stemmed_normal_index = {}
+    stems = []
+    for word in words:
+        if word in stop_words:
+            continue
+        word_stem = stem(word)
+        stemmed_normal_index[word_stem] = word
+        # Exclude words with length <=2
+        if len(word) > 2:
+            stems.append(word_stem)
 
+    return [stemmed_normal_index[word_stem] for word_stem in stems]
 
-def count_external_domains(articles: dict) -> int:
+
+def count_external_domains(article: dict) -> int:
     """
-    To calculate external domains for each profile we create a list with the unique external domains for each article, for all articles
+    Number of unique external domains of an article, summed for all articles to calculate external domains for each profile
     """
-    domains = []
-    for links_per_article in articles:
-        domains_per_article = []
-        for link in links_per_article["links"]:
-            href = link[1]
-            if validators.url(href) and not re.search(EXCLUDE_URLS + "|medium", href):
-                domains_per_article.append(urlparse(href).netloc)
-        domains.extend(list(set(domains_per_article)))
-    return len(domains)
+    return len({link.domain for link in article["normalized_links"] if link.valid and not link.excluded_from_profile})
 
 
-def counts(words: list, include_stemming=True) -> dict:
+def ngram_counts(words: list, n: int) -> Counter:
+    """
+    Count n-grams as tuples, streaming over the words without building the n-grams list
+    """
+    return Counter(zip(*[islice(words, i, None) for i in range(n)]))
+
+
+def most_common(counter: Counter, top: int) -> list:
+    """
+    Top <top> items of a counter (heap based, same order as Counter.most_common), tuple keys are joined with spaces
+    """
+    return [(' '.join(key) if isinstance(key, tuple) else key, count) for key, count in heapq.nlargest(top, counter.items(), key=itemgetter(1))]
+
+
+def counts(words: list, include_stemming=True, keep_lists=True) -> dict:
     """
     Calculates article statistics : most common words, most common bigrams/trigrams etc
+    Bigram and trigram counts are keyed by tuples. If keep_lists=False the bigrams/trigrams lists are not returned.
     """
     if include_stemming:
         # Create a PorterStemmer object
@@ -81,25 +204,15 @@ def counts(words: list, include_stemming=True) -> dict:
     else:
         stemmed_words = words
 
-    # Count the frequency of each stemmed word
+    # Count the frequency of each stemmed word, bigram and trigram
     word_counts = Counter(stemmed_words)
+    bigram_counts = ngram_counts(stemmed_words, 2)
+    trigram_counts = ngram_counts(stemmed_words, 3)
 
-    # Find most frequent words
-    most_common_words = word_counts.most_common(30)
-
-    # Create a list of bigrams and count their frequency
-    bigrams = get_ngrams(stemmed_words, 2)
-    bigram_counts = Counter(bigrams)
-
-    # Find most frequent bigrams
-    most_common_bigrams = bigram_counts.most_common(15)
-
-    # Create a list of trigrams and count their frequency
-    trigrams = get_ngrams(stemmed_words, 3)
-    trigram_counts = Counter(trigrams)
-
-    # Find most frequent trigrams
-    most_common_trigrams = trigram_counts.most_common(10)
+    # Find most frequent words, bigrams and trigrams
+    most_common_words = most_common(word_counts, 30)
+    most_common_bigrams = most_common(bigram_counts, 15)
+    most_common_trigrams = most_common(trigram_counts, 10)
 
     # Get article type
     if len(stemmed_words) < 100:
@@ -110,15 +223,21 @@ def counts(words: list, include_stemming=True) -> dict:
         words_num_cat = "medium"
     elif len(stemmed_words) < 1800:
         words_num_cat = "large"
-    elif len(stemmed_words) > 1800:
+    else:
         words_num_cat = "very large"
 
-    return {"words": stemmed_words, "words_all": words, "word_counts": word_counts, "most_common_words": most_common_words,
-            "bigrams": bigrams, "bigram_counts": bigram_counts, "most_common_bigrams": most_common_bigrams,
-            "trigrams": bigrams, "trigram_counts": bigram_counts, "most_common_trigrams": most_common_trigrams,
-            "words_num_all": len(words), "words_num": len(stemmed_words), "words_num_cat": words_num_cat,
-            "unique_words_num_all": len(list(set(words))), "unique_words_num": len(list(set(stemmed_words))),
-            }
+    rs = {"words": stemmed_words, "words_all": words, "word_counts": word_counts, "most_common_words": most_common_words,
+          "bigram_counts": bigram_counts, "most_common_bigrams": most_common_bigrams,
+          "trigram_counts": trigram_counts, "most_common_trigrams": most_common_trigrams,
+          "words_num_all": len(words), "words_num": len(stemmed_words), "words_num_cat": words_num_cat,
+          "unique_words_num_all": len(set(words)), "unique_words_num": len(word_counts),
+          }
+
+    if keep_lists:
+        rs["bigrams"] = get_ngrams(stemmed_words, 2)
+        rs["trigrams"] = get_ngrams(stemmed_words, 3)
+
+    return rs
 
 
 def html_to_words(soup):
@@ -132,8 +251,15 @@ def html_to_words(soup):
     return words
 
 
-def page_analyzer(soup) -> dict:
-    # Parse the HTML content using BeautifulSoup
+@timed("parse_markdown")
+def parse_markdown(markdown_text: str) -> dict:
+    """
+    Convert article markdown to html and parse it once.
+    The result (headings and visible words) is shared by page_analyzer() and chatgpt_parser().
+    """
+    html = markdown.markdown(markdown_text)
+    soup = bs4.BeautifulSoup(html, features="lxml")
+
     try:
         h1 = soup.find('h1').text.strip()
     except Exception as exc:
@@ -149,50 +275,195 @@ def page_analyzer(soup) -> dict:
     # Split the text content into words
     words = html_to_words(soup)
 
-    pos_tags = pos_tagger(words)
-    counters = counts(words)
+    return {"h1": h1, "h2": h2, "words": words}
+
+
+@timed("page_analyzer")
+def page_analyzer(document: dict, tagger: str = DEFAULT_TAGGER) -> dict:
+    """
+    Analyze a document returned by parse_markdown()
+    """
+    words = document["words"]
+    count("words_analyzed", len(words))
+
+    pos_tags = pos_tagger(words, tagger=tagger)
+    counters = counts(words, keep_lists=False)
 
-    rs = {"h1": h1, "h2": h2}
+    # Keep mergeable summaries (see ProfileCounter) instead of the word lists
+    del counters["words"], counters["words_all"]
+    rs = {"h1": document["h1"], "h2": document["h2"], "unique_words_all": set(words)}
 
     return {**counters, **rs, **pos_tags}
 
 
-def safe_div(x: int, y: int) -> float:
-    try:
-        return x / y
-    except ZeroDivisionError:
-        return 0
+class ProfileCounter:
+    """
+    Combine article statistics (returned by page_analyzer()) to profile statistics by summing their counters,
+    so that profile statistics do not need to tag or count the words of all articles again.
+    UPA (unique per article) counters count each word, bigram or trigram once per article.
+    """
 
+    def __init__(self):
+        self.word_counts = Counter()
+        self.bigram_counts = Counter()
+        self.trigram_counts = Counter()
+        self.upa_word_counts = Counter()
+        self.upa_bigram_counts = Counter()
+        self.upa_trigram_counts = Counter()
+        self.pos_stats = Counter()
+        self.unique_words_all = set()
+        self.words_num_all = 0
+        self.words_num = 0
+
+    def add(self, stats: dict):
+        self.word_counts.update(stats["word_counts"])
+        self.bigram_counts.update(stats["bigram_counts"])
+        self.trigram_counts.update(stats["trigram_counts"])
+        self.upa_word_counts.update(stats["word_counts"].keys())
+        self.upa_bigram_counts.update(stats["bigram_counts"].keys())
+        self.upa_trigram_counts.update(stats["trigram_counts"].keys())
+        self.pos_stats.update({pos: stats[pos] for pos in ["adj", "noun", "verb"]})
+        self.unique_words_all.update(stats["unique_words_all"])
+        self.words_num_all += stats["words_num_all"]
+        self.words_num += stats["words_num"]
+
+    def summary(self) -> dict:
+        return {
+            "words_counts": {"most_common_words": most_common(self.word_counts, 30),
+                             "most_common_bigrams": most_common(self.bigram_counts, 15),
+                             "most_common_trigrams": most_common(self.trigram_counts, 10)},
+            "words_upa_counts": {"most_common_words": most_common(self.upa_word_counts, 30),
+                                 "most_common_bigrams": most_common(self.upa_bigram_counts, 15),
+                                 "most_common_trigrams": most_common(self.upa_trigram_counts, 10)},
+            "pos_stats": {pos: self.pos_stats[pos] for pos in ["adj", "noun", "verb"]},
+            "words_num_all": self.words_num_all,
+            "unique_words_num_all": len(self.unique_words_all),
+            "words_num": self.words_num,
+            "unique_words_num": len(self.word_counts),
+        }
+
+
+class ArticleCounter:
+    """
+    Combine article fields (claps, voters, publication, published date, length and ChatGPT keywords) to profile statistics
+    one article at a time, so that profile statistics do not need the list of all articles.
+    """
 
-def counter_to_text(lst: list) -> str:
-    return ", ".join([f"{x[0]}({x[1]})" for x in lst])
+    def __init__(self, followers: int):
+        self.followers = followers
+        self.articles_num = 0
+        self.domains_num = 0
+        self.clap_voter_total = 0
+        self.voter_follower_total = 0
+        self.publication = Counter()
+        self.article_length_cat = Counter()
+        self.published_time_period = Counter()
+        self.published_day_of_week = Counter()
+        self.first_date = None
+        self.last_date = None
+        # ChatGPT keywords are counted by stem and shown as the last word seen with that stem (see text_stemmer())
+        self.keyword_stems = Counter()
+        self.keyword_words = {}
+        self.top_article = None
+        self.most_voters = 0
+
+    def add_keywords(self, keywords: list):
+        stop_words = get_stop_words()
+        for word in keywords:
+            if word in stop_words:
+                continue
+            word_stem = stem(word)
+            self.keyword_words[word_stem] = word
+            if len(word) > 2:
+                self.keyword_stems[word_stem] += 1
+
+    def add(self, article: dict, stats: dict):
+        self.articles_num += 1
+        self.domains_num += count_external_domains(article)
+        self.clap_voter_total += safe_div(article["clap_count"], article["voter_count"])
+        self.voter_follower_total += safe_div(article["voter_count"], self.followers)
+        self.publication[article["publisher_name"]] += 1
+        self.article_length_cat[stats["words_num_cat"]] += 1
+
+        published_at = article["published_at"]
+        self.published_time_period[f"{published_at['time_period'][0]}-{published_at['time_period'][1]}"] += 1
+        self.published_day_of_week[get_day_of_week(published_at["date"])] += 1
+        self.first_date = published_at["date"] if self.first_date is None else min(self.first_date, published_at["date"])
+        self.last_date = published_at["date"] if self.last_date is None else max(self.last_date, published_at["date"])
+
+        self.add_keywords(article["chatgpt"]["unikeywords"])
+
+        # Find top article based on voters count (unique claps)
+        if article["voter_count"] > self.most_voters:
+            self.top_article = (article["url"], stats["h1"], article["publisher_name"])
+            self.most_voters = article["voter_count"]
+
+    def summary(self) -> dict:
+        return {
+            "articles_num": self.articles_num,
+            "domains_num": self.domains_num,
+            "top_article": self.top_article,
+            "clap_voter_avg": self.clap_voter_total / self.articles_num,
+            "voter_follower_avg": self.voter_follower_total / self.articles_num,
+            "publication": self.publication.most_common(10),
+            "article_length_cat": self.article_length_cat.most_common(3),
+            "published_time_period": self.published_time_period.most_common(10),
+            "published_day_of_week": self.published_day_of_week.most_common(10),
+            # Average days between two consecutive articles, first and last published date
+            "published_frequency": (safe_div((self.last_date - self.first_date).days, self.articles_num - 1), str(self.first_date), str(self.last_date)),
+            "last_date_seen": self.last_date,
+            "chatgpt_words_count": most_common(Counter({self.keyword_words[word_stem]: count for word_stem, count in self.keyword_stems.items()}), 30),
+        }
+
+
+# Article stats that are only needed to build profile stats (see ProfileCounter), dropped by compact_stats()
+COUNTER_FIELDS = ["word_counts", "bigram_counts", "trigram_counts", "unique_words_all"]
+
+
+def compact_stats(stats: dict) -> dict:
+    """
+    Article stats without the counters, after they are added to the profile stats
+    """
+    return {key: value for key, value in stats.items() if key not in COUNTER_FIELDS}
 
 
-def find_list_div_avg(list1, list2):
-    total = 0
-    for i in range(len(list1)):
-        total += safe_div(list1[i], list2[i])
+# Bump when parse_markdown() or page_analyzer() results change, cached analysis results (see AnalysisCache) are then ignored
+ANALYZER_VERSION = 1
 
-    average = total / len(list1)
-    return average
 
+def analyzer_key(tagger: str = DEFAULT_TAGGER) -> str:
+    return f"v{ANALYZER_VERSION}-{tagger}"
 
-def find_dates_frequency(dates: list) -> float:
-    # Sort the list of dates in ascending order
-    dates.sort()
 
-    # Calculate the frequency of each interval
-    freq = []
-    for i in range(len(dates) - 1):
-        interval = dates[i + 1] - dates[i]
-        freq.append(interval.days)
+def analyze_markdown(markdown_text: str, tagger: str = DEFAULT_TAGGER) -> tuple:
+    """
+    Parse and analyze article markdown, returns the parsed document and its statistics
+    """
+    document = parse_markdown(markdown_text)
+    return document, page_analyzer(document, tagger=tagger)
+
+
+def analyze_markdowns(markdowns: list, workers: int = 1, tagger: str = DEFAULT_TAGGER) -> list:
+    """
+    Parse and analyze many articles. If workers > 1 articles are sent in batches to a pool of <workers> processes,
+    each process loads NLTK resources once. Results keep the order of markdowns.
+    """
+    if workers <= 1:
+        return [analyze_markdown(markdown_text, tagger=tagger) for markdown_text in markdowns]
 
-    # Calculate the average frequency
-    avg_freq = sum(freq) / len(freq)
-    min_date = str(max(dates))
-    max_date = str(min(dates))
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_resources) as executor:
+        return list(executor.map(partial(analyze_markdown, tagger=tagger), markdowns, chunksize=max(len(markdowns) // (workers * 4), 1)))
 
-    return avg_freq, max_date, min_date
+
+def safe_div(x: int, y: int) -> float:
+    try:
+        return x / y
+    except ZeroDivisionError:
+        return 0
+
+
+def counter_to_text(lst: list) -> str:
+    return ", ".join([f"{x[0]}({x[1]})" for x in lst])
 
 
 def days_between(d1: datetime, d2: datetime = None) -> int:
@@ -203,6 +474,7 @@ def days_between(d1: datetime, d2: datetime = None) -> int:
     return (d2 - d1).days
 
 
+@timed("stats_to_text")
 def stats_to_text(article_stats: dict, article_chars: dict, user_chars: dict) -> str:
     claps_per_person = safe_div(article_chars["clap_count"], article_chars["voter_count"])
     voter_follower = safe_div(article_chars["voter_count"], user_chars["info"]["followers_count"])
@@ -236,51 +508,44 @@ def stats_to_text(article_stats: dict, article_chars: dict, user_chars: dict) ->
         """
 
 
+@timed("profile_to_text")
 def profile_to_text(all_data: dict, profile_stats: dict, fixed_last_date: datetime = None) -> str:
     words_upa_counts = profile_stats["words_upa_counts"]
     chatgpt_words_count = profile_stats["chatgpt_words_count"]
     words_counts = profile_stats["words_counts"]
     pos_stats = profile_stats["pos_stats"]
 
-    domains_number = count_external_domains(all_data["articles"])
-    article_length_cat = Counter(profile_stats['article_length_cat']).most_common(3)
-    publication_count = Counter(profile_stats['publication']).most_common(10)
-    published_frequency = find_dates_frequency([x['date'] for x in profile_stats["published_at"]])
-    published_time_period_count = Counter([f"{x['time_period'][0]}-{x['time_period'][1]}" for x in profile_stats["published_at"]]).most_common(10)
-    published_day_of_week_count = Counter([f"{get_day_of_week(x['date'])}" for x in profile_stats["published_at"]]).most_common(10)
     followers = all_data["user"]["info"]["followers_count"]
 
-    words_all_num = len(profile_stats["user_words_all"])
-    unique_words_all_num = len(set(profile_stats["user_words_all"]))
-    words_num = len(profile_stats["user_words"])
-    unique_words_num = len(set(profile_stats["user_words"]))
-
-    clap_voter_avg = find_list_div_avg(profile_stats["clap_count"], profile_stats["voter_count"])
-    voter_follower_avg = find_list_div_avg(profile_stats["voter_count"], [followers] * len(profile_stats["voter_count"]))
+    words_all_num = profile_stats["words_num_all"]
+    unique_words_all_num = profile_stats["unique_words_num_all"]
+    words_num = profile_stats["words_num"]
+    unique_words_num = profile_stats["unique_words_num"]
 
-    last_date_seen = max([x["date"] for x in profile_stats["published_at"]])
+    articles_num = profile_stats["articles_num"]
+    published_frequency = profile_stats["published_frequency"]
     bio = all_data["user"]["info"]["bio"]
 
     return f"""
         <b>BIO</b>: {bio} <br>
 
-        <b>Articles</b>: {len(all_data["articles"])} ({len(words_counts["words"])} stemmed words) <br>
+        <b>Articles</b>: {articles_num} ({words_num} stemmed words) <br>
         <b>Top article</b>: <a href='{profile_stats["top_article"][0]}'>{profile_stats["top_article"][1]} ({profile_stats["top_article"][2]})</a> <br>
 
-        <b>Publications</b>: {counter_to_text(publication_count)} <br>
+        <b>Publications</b>: {counter_to_text(profile_stats["publication"])} <br>
         <b>Followers</b>: {followers} <br>
         
-        <b>Voters - Followers % (Article AVG)</b>: {round(voter_follower_avg * 100, 1)}%<br>
-        <b>Claps per Person (Article AVG)</b>: {round(clap_voter_avg, 1)}<br>
+        <b>Voters - Followers % (Article AVG)</b>: {round(profile_stats["voter_follower_avg"] * 100, 1)}%<br>
+        <b>Claps per Person (Article AVG)</b>: {round(profile_stats["clap_voter_avg"], 1)}<br>
         <br>
         
-        <b>Preferred Published Time</b>: {counter_to_text(published_time_period_count)} <br>
-        <b>Preferred Published Day</b>: {counter_to_text(published_day_of_week_count)} <br>
-        <b>Preferred Article Length (stemmed)</b>: {counter_to_text(article_length_cat)} <br>
+        <b>Preferred Published Time</b>: {counter_to_text(profile_stats["published_time_period"])} <br>
+        <b>Preferred Published Day</b>: {counter_to_text(profile_stats["published_day_of_week"])} <br>
+        <b>Preferred Article Length (stemmed)</b>: {counter_to_text(profile_stats["article_length_cat"])} <br>
         <b>Published Frequency (AVG)</b>: per {round(published_frequency[0], 1)} days ({published_frequency[1]}/{published_frequency[2]}) <br>
-        <b>Last Seen </b>: before {days_between(last_date_seen, fixed_last_date)} days<br>
+        <b>Last Seen </b>: before {days_between(profile_stats["last_date_seen"], fixed_last_date)} days<br>
 
-        <b>External Domains per Article </b>: {round(safe_div(domains_number, len(all_data["articles"])), 1)}<br>
+        <b>External Domains per Article </b>: {round(safe_div(profile_stats["domains_num"], articles_num), 1)}<br>
 
         <br>
         <b>Stemmed words / words</b>: {round(safe_div(words_num, words_all_num) * 100, 1)}% ({words_num} / {words_all_num})<br>
@@ -303,88 +568,152 @@ def profile_to_text(all_data: dict, profile_stats: dict, fixed_last_date: dateti
         """
 
 
-def chatgpt_api(soup, num_keyphrases=10, dummy=False):
-    if dummy:
-        return "hello this is a test"
-
-    stop_words = set(stopwords.words('english'))
-    words = html_to_words(soup)
-    new_words = [x for x in words if x not in stop_words and len(x) > 2]
+class ChatGPTBudget:
+    """
+    Requests per minute and tokens per minute budget shared between threads (sliding window of 60 seconds).
+    acquire() blocks until a request of <tokens> tokens fits in the budget. A limit of 0 means no limit.
+    """
 
+    def __init__(self, requests_per_minute: int = CHATGPT_RPM, tokens_per_minute: int = CHATGPT_TPM):
+        if requests_per_minute < 0 or tokens_per_minute < 0:
+            raise ValueError(f"requests_per_minute and tokens_per_minute must be >= 0 (0 for no limit), got {requests_per_minute} and {tokens_per_minute}")
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = deque()
+        self.window_tokens = 0
+        self.lock = threading.Lock()
+
+    def fits(self, tokens: int) -> bool:
+        return ((not self.requests_per_minute or len(self.window) < self.requests_per_minute) and
+                (not self.tokens_per_minute or self.window_tokens + tokens <= self.tokens_per_minute))
+
+    def acquire(self, tokens: int):
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.window and now - self.window[0][0] >= 60:
+                    self.window_tokens -= self.window.popleft()[1]
+                if self.fits(tokens):
+                    self.window.append((now, tokens))
+                    self.window_tokens += tokens
+                    return
+                if not self.window:
+                    raise ValueError(f"a request of {tokens} tokens never fits in the budget of {self.requests_per_minute} requests "
+                                     f"and {self.tokens_per_minute} tokens per minute")
+                wait = 60 - (now - self.window[0][0])
+            time.sleep(wait)
+
+
+@lru_cache(maxsize=None)
+def token_encoding():
+    """
+    Load the tiktoken encoding of CHATGPT_MODEL on first use (it may be downloaded), None if tiktoken is not installed
+    or the encoding cannot be loaded
+    """
+    if not tiktoken:
+        return None
     try:
-        full_text = " ".join(new_words[0:2000])
-
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user",
-                 "content": f"""Please provide a summary and suggest the top {num_keyphrases} keywords that best describe the important topics or themes present in the following text. Your answer should include the format: KEYWORDS=keyword_1, keyword_2, ..., keyword_{num_keyphrases} and SUMMARY=summary_text.\n\n {full_text}"""},
-            ]
-        )
+        return tiktoken.encoding_for_model(CHATGPT_MODEL)
     except Exception as exc:
-        print(exc)
+        print(f"could not load the tiktoken encoding ({exc}), estimating ChatGPT tokens...")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken if it is installed, else estimate them (about 4 characters per token)
+    """
+    encoding = token_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
 
-        full_text = " ".join(new_words[0:1000])
 
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user",
-                 "content": f"""Please provide a summary and suggest the top {num_keyphrases} keywords that best describe the important topics or themes present in the following text. Your answer should include the format: KEYWORDS=keyword_1, keyword_2, ..., keyword_{num_keyphrases} and SUMMARY=summary_text.\n\n {full_text}"""},
-            ]
-        )
+def truncate_words(words: list, max_tokens: int) -> str:
+    """
+    Join as many words as fit in <max_tokens> tokens
+    """
+    text = " ".join(words)
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    # Binary search the number of words that fit
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[0:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[0:low])
+
+
+@timed("chatgpt_api")
+def chatgpt_api(words: list, num_keyphrases=CHATGPT_KEYPHRASES, dummy=False, budget: ChatGPTBudget = None, max_tries: int = CHATGPT_MAX_TRIES):
+    """
+    Ask ChatGPT for a summary and keywords. The text is truncated to fit the model context.
+    Rate limit errors are retried with exponential backoff, other errors are raised.
+    """
+    if dummy:
+        return "hello this is a test"
+
+    stop_words = get_stop_words()
+    new_words = [x for x in words if x not in stop_words and len(x) > 2]
+
+    prompt_tokens = count_tokens(CHATGPT_PROMPT.format(num_keyphrases=num_keyphrases, full_text=""))
+    full_text = truncate_words(new_words, CHATGPT_CONTEXT_TOKENS - CHATGPT_REPLY_TOKENS - prompt_tokens)
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": CHATGPT_PROMPT.format(num_keyphrases=num_keyphrases, full_text=full_text)},
+    ]
+
+    request_tokens = prompt_tokens + count_tokens(full_text) + CHATGPT_REPLY_TOKENS
+    count("chatgpt.requested_tokens", request_tokens)
+    for attempt in range(1, max_tries + 1):
+        if budget:
+            budget.acquire(request_tokens)
+        try:
+            response = openai.ChatCompletion.create(model=CHATGPT_MODEL, messages=messages, max_tokens=CHATGPT_REPLY_TOKENS)
+            break
+        except openai.error.RateLimitError as exc:
+            count("chatgpt.rate_limited")
+            if attempt == max_tries:
+                raise
+            print(f"rate limited ({exc}), retrying...")
+            time.sleep(min(2 ** attempt, 60))
 
     reply = response["choices"][0]["message"]["content"]
 
     return reply
 
 
-def chatgpt_parser(username, soup, article_id):
-    # Define the filename and API endpoint URL
-    filename = f'data\{username}_openai_responses.csv'
-
-    # Check if the file exists
-    if os.path.exists(filename):
-        # If the file exists, open it and search for the ID
-        with open(filename, 'r') as f:
-            found = False
-            reader = csv.reader(f, delimiter='\t')
-            lines = []
-            for cols in reader:
-                if cols[0] == article_id:
-                    print(f"id {article_id} found, using local file...")
-                    # If the ID is found, use the associated response
-                    response = cols[1]
-                    found = True
-                else:
-                    # Otherwise, add the line to the list of lines
-                    lines.append(cols)
-            if not found:
-                print(f"id {article_id} not found, using the api...")
-                # If the ID is not found, use the API and add the new ID and response to the file
-                response = chatgpt_api(soup)
-                lines.append([article_id, response])
-                with open(filename, 'a', newline='', encoding='utf8') as f:
-                    writer = csv.writer(f, delimiter='\t')
-                    writer.writerow([article_id, response])
-    else:
-        # If the file does not exist, use the API and create the file with the new ID and response
-        response = chatgpt_api(soup)
-        with open(filename, 'w', newline='', encoding='utf8') as f:
-            writer = csv.writer(f, delimiter='\t')
-            writer.writerow([article_id, response])
-
-    # Do something with the response
-    # Find the keywords and summary in the text
+def chatgpt_response_cache(username: str = None) -> ResponseCache:
+    """
+    Open the ChatGPT response cache for the current model and prompt.
+    If a <username>_openai_responses.csv file exists (older versions), its responses are imported.
+    """
+    cache = ResponseCache(prompt_hash(CHATGPT_MODEL, CHATGPT_PROMPT))
+    csv_file_name = os.path.join('data', f'{username}_openai_responses.csv')
+    if username and os.path.exists(csv_file_name):
+        imported = cache.import_csv(csv_file_name)
+        if imported:
+            print(f"imported {imported} responses from {csv_file_name}...")
+    return cache
+
+
+def parse_chatgpt_response(response: str) -> dict:
+    """
+    Find the keywords and summary in a ChatGPT response
+    """
     keywords = "error"
     summary = "error"
+    unikeywords = []
 
     try:
         keywords = re.search(r'KEYWORDS(?:\s+)?(?:\=|\:)(?:\s+)?([\w\,\-0-9\n\t\s]+)(?:SUMMARY)?', response).group(1).split(",")
         keywords = [x.strip().lower().replace(".", "") for x in keywords]
-        unikeywords = []
         for x in keywords:
             unikeywords.extend(x.split(" "))
         unikeywords = list(set(unikeywords))
@@ -397,3 +726,40 @@ def chatgpt_parser(username, soup, article_id):
         pass
 
     return {"keywords": keywords, "summary": summary, "unikeywords": unikeywords}
+
+
+def chatgpt_parser(words: list, article_id: str, cache: ResponseCache, budget: ChatGPTBudget = None) -> dict:
+    response = cache.get(article_id)
+    if response is not None:
+        print(f"id {article_id} found, using local file...")
+        count("chatgpt_cache.hits")
+    else:
+        count("chatgpt_cache.misses")
+        print(f"id {article_id} not found, using the api...")
+        # If the ID is not found, use the API and add the new ID and response to the cache
+        response = chatgpt_api(words, budget=budget)
+        cache.put(article_id, response)
+
+    return parse_chatgpt_response(response)
+
+
+def chatgpt_document(article_id: str, words: list, cache: ResponseCache, budget: ChatGPTBudget = None) -> dict:
+    """
+    Get ChatGPT keywords and summary of an article, an article that fails is marked as error (and is retried on the next run)
+    """
+    try:
+        return chatgpt_parser(words, article_id, cache, budget=budget)
+    except Exception as exc:
+        print(f"ChatGPT failed for id {article_id}: {exc}")
+        return {"keywords": [], "summary": "error", "unikeywords": []}
+
+
+@timed("chatgpt_enrich")
+def chatgpt_enrich(documents: list, cache: ResponseCache, workers: int = CHATGPT_WORKERS, budget: ChatGPTBudget = None) -> list:
+    """
+    Get ChatGPT keywords and summary for many (article_id, words) documents, using <workers> threads within <budget>.
+    Articles that fail are marked as errors (and are retried on the next run). Results keep the order of documents.
+    """
+    budget = budget or ChatGPTBudget()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        return list(executor.map(lambda document: chatgpt_document(*document, cache, budget=budget), documents))